@@ -0,0 +1,98 @@
+import os
+import re
+import time
+import hashlib
+import threading
+from collections import OrderedDict
+import numpy as np
+
+ANSWER_CACHE_ENTRIES = int(os.environ.get('ANSWER_CACHE_ENTRIES', 512))
+ANSWER_CACHE_TTL_SECONDS = int(os.environ.get('ANSWER_CACHE_TTL_SECONDS', 24 * 3600))
+# Cosine similarity above which a reworded question reuses a cached answer
+# drawn from the same retrieved chunks. Off by default: questions that differ
+# in one word ("bronze" vs "silver") can still embed this close, so set
+# ANSWER_CACHE_SEMANTIC=1 only where that risk is acceptable.
+SEMANTIC_CACHE_ENABLED = os.environ.get('ANSWER_CACHE_SEMANTIC', '0') == '1'
+SEMANTIC_SIMILARITY_THRESHOLD = float(os.environ.get('ANSWER_CACHE_SIMILARITY', 0.97))
+
+_entries = OrderedDict()
+_lock = threading.Lock()
+
+def normalize_question(question):
+    question = question.lower().strip()
+    question = re.sub(r'[^\w\s]', ' ', question)
+    return ' '.join(question.split())
+
+def _context(context_ids):
+    return tuple(sorted(context_ids))
+
+def make_key(question, context_ids):
+    context = ','.join(f"{namespace}:{vector_id}" for namespace, vector_id in _context(context_ids))
+    raw = f"{normalize_question(question)}|{context}"
+    return hashlib.sha256(raw.encode('utf-8')).hexdigest()
+
+def _unit(vector):
+    vector = np.asarray(vector, dtype='float32').ravel()
+    norm = np.linalg.norm(vector)
+    return vector / norm if norm else vector
+
+def _drop_expired(now):
+    expired = [key for key, entry in _entries.items() if entry['expires_at'] <= now]
+    for key in expired:
+        del _entries[key]
+
+def get(key):
+    with _lock:
+        entry = _entries.get(key)
+        if entry is None:
+            return None
+        if entry['expires_at'] <= time.time():
+            del _entries[key]
+            return None
+        _entries.move_to_end(key)
+        return entry['answer']
+
+def lookup_similar(query_vector, namespaces, context_ids):
+    """Return a cached answer to a near-identical question that retrieved the same chunks."""
+    if not SEMANTIC_CACHE_ENABLED:
+        return None
+    query = _unit(query_vector)
+    context = _context(context_ids)
+    with _lock:
+        _drop_expired(time.time())
+        candidates = [(key, entry) for key, entry in _entries.items()
+                      if entry['namespaces'] == namespaces and entry['context'] == context]
+        if not candidates:
+            return None
+        matrix = np.stack([entry['query_vector'] for _, entry in candidates])
+        similarities = matrix @ query
+        best = int(np.argmax(similarities))
+        if similarities[best] < SEMANTIC_SIMILARITY_THRESHOLD:
+            return None
+        key, entry = candidates[best]
+        _entries.move_to_end(key)
+        return entry['answer']
+
+def put(key, answer, namespaces, query_vector, context_ids):
+    with _lock:
+        _entries[key] = {
+            'answer': answer,
+            'namespaces': tuple(namespaces),
+            'context': _context(context_ids),
+            'query_vector': _unit(query_vector),
+            'expires_at': time.time() + ANSWER_CACHE_TTL_SECONDS,
+        }
+        _entries.move_to_end(key)
+        while len(_entries) > ANSWER_CACHE_ENTRIES:
+            _entries.popitem(last=False)
+
+def invalidate(namespace):
+    """Forget every answer that drew on the given knowledge base."""
+    with _lock:
+        stale = [key for key, entry in _entries.items() if namespace in entry['namespaces']]
+        for key in stale:
+            del _entries[key]
+
+def clear():
+    with _lock:
+        _entries.clear()
@@ -1,39 +1,104 @@
-from flask import Flask, render_template, request, redirect, url_for, jsonify
-import pytesseract
-from PIL import Image
-from pdf2image import convert_from_path
+from flask import Flask, Request, render_template, request, redirect, url_for, jsonify, session, Response, stream_with_context, send_from_directory
 import os
+import json
 import re
-
-try:
-    from train_authenticity_model import DocumentAuthenticityDetector
-    authenticity_detector = DocumentAuthenticityDetector()
-except Exception as e:
-    print(f"Warning: Authenticity detector not available: {e}")
-    authenticity_detector = None
-
-TESSERACT_PATH = r'C:\Program Files\Tesseract-OCR\tesseract.exe'
-
-pytesseract.pytesseract.tesseract_cmd = TESSERACT_PATH
-
+import uuid
+import threading
+import ocr_engine
+import job_queue
+import upload_store
+import upload_catalog
+import thumbnails
+import gst_registry
+import gst_extractor
 import chatbot_logic
 
+class UploadRequest(Request):
+    def _get_file_stream(self, total_content_length, content_type, filename=None, content_length=None):
+        # Parse each uploaded file straight into the upload folder instead of a spooled temp file
+        return upload_store.UploadSpool()
+
 app = Flask(__name__)
+app.request_class = UploadRequest
+app.secret_key = os.environ.get('FLASK_SECRET_KEY') or os.urandom(24)
+# Three files per /ocr form plus multipart overhead; each file is also
+# checked against MAX_UPLOAD_BYTES as UploadRequest parses it to disk.
+app.config['MAX_CONTENT_LENGTH'] = 3 * upload_store.MAX_UPLOAD_BYTES + 1024 * 1024
+
+BRONZE_MANUAL = 'User_Manual_Bronze_Certification_20.04.2022.pdf'
+
+_authenticity_detector = None
+_detector_lock = threading.Lock()
+readiness = {
+    'knowledge_base': 'pending',
+    'authenticity_detector': 'pending',
+    'models': 'pending'
+}
+
+def get_authenticity_detector():
+    global _authenticity_detector
+    if _authenticity_detector is None:
+        with _detector_lock:
+            if _authenticity_detector is None:
+                try:
+                    from train_authenticity_model import DocumentAuthenticityDetector
+                    _authenticity_detector = DocumentAuthenticityDetector()
+                except Exception as e:
+                    print(f"Warning: Authenticity detector not available: {e}")
+                    _authenticity_detector = False
+    return _authenticity_detector or None
+
+def run_backfills():
+    # Hashes every stored upload on first start, so it runs beside warm_up rather than before it
+    for name, backfill in (('upload catalog', upload_catalog.backfill), ('GST registry', gst_registry.backfill)):
+        try:
+            backfill()
+        except Exception as e:
+            print(f"Warning: {name} backfill failed: {e}")
+
+def warm_up():
+    kb = None
+    try:
+        kb = chatbot_logic.get_base_kb()
+        readiness['knowledge_base'] = 'ready'
+    except Exception as e:
+        print(f"Warning: could not load the chatbot knowledge base: {e}")
+        readiness['knowledge_base'] = 'unavailable'
+
+    threading.Thread(target=run_backfills, name="backfill", daemon=True).start()
+
+    readiness['authenticity_detector'] = 'ready' if get_authenticity_detector() else 'unavailable'
+
+    try:
+        chatbot_logic.warm_up_models()
+        readiness['models'] = 'ready'
+    except Exception as e:
+        print(f"Warning: could not warm up Ollama models: {e}")
+        readiness['models'] = 'unavailable'
+
+    # Without a prebuilt knowledge base (see load_all_documents.py) fall back to
+    # learning the manual here, off the request path.
+    bronze_cert_path = os.path.join(os.getcwd(), BRONZE_MANUAL)
+    if kb is not None and os.path.exists(bronze_cert_path) and kb.index.ntotal == 0:
+        print("Loading Bronze Certificate User Manual into chatbot...")
+        try:
+            success, msg = chatbot_logic.add_document_to_knowledge_base(bronze_cert_path, BRONZE_MANUAL)
+        except Exception as e:
+            success, msg = False, str(e)
+        if success:
+            print(f"{msg}")
+        else:
+            print(f"Failed to load manual: {msg}")
 
-chatbot_logic.init_chatbot()
+# OCR pool workers re-import this module as __mp_main__ on Windows; only the
+# server process should warm up.
+if __name__ != '__mp_main__':
+    threading.Thread(target=warm_up, name="warm-up", daemon=True).start()
 
-import os as _os
-bronze_cert_path = _os.path.join(_os.getcwd(), 'User_Manual_Bronze_Certification_20.04.2022.pdf')
-if _os.path.exists(bronze_cert_path) and chatbot_logic.index.ntotal == 0:
-    print("Loading Bronze Certificate User Manual into chatbot...")
-    success, msg = chatbot_logic.add_document_to_knowledge_base(
-        bronze_cert_path, 
-        'User_Manual_Bronze_Certification_20.04.2022.pdf'
-    )
-    if success:
-        print(f"{msg}")
-    else:
-        print(f"Failed to load manual: {msg}")
+@app.route('/api/ready')
+def ready():
+    is_ready = readiness['knowledge_base'] == 'ready' and readiness['authenticity_detector'] != 'pending'
+    return jsonify({'ready': is_ready, 'components': readiness}), (200 if is_ready else 503)
 
 @app.route('/')
 def default():
@@ -51,51 +116,104 @@ def index():
 def chatbot():
     return render_template('chatbot.html')
 
+def format_size(size):
+    if size < 1024:
+        return f"{size} B"
+    if size < 1024 * 1024:
+        return f"{size / 1024:.1f} KB"
+    return f"{size / (1024 * 1024):.1f} MB"
+
 @app.route('/gallery')
 def gallery():
     from datetime import datetime
-    
-    upload_folder = os.path.join('static', 'uploads')
-    documents = []
-    
-    if os.path.exists(upload_folder):
-        for filename in os.listdir(upload_folder):
-            filepath = os.path.join(upload_folder, filename)
-            
-            if os.path.isfile(filepath):
-                file_size = os.path.getsize(filepath)
-                if file_size < 1024:
-                    size_str = f"{file_size} B"
-                elif file_size < 1024 * 1024:
-                    size_str = f"{file_size / 1024:.1f} KB"
-                else:
-                    size_str = f"{file_size / (1024 * 1024):.1f} MB"
-                
-                mod_time = os.path.getmtime(filepath)
-                date_str = datetime.fromtimestamp(mod_time).strftime('%Y-%m-%d %H:%M')
-                
-                doc_type = 'other'
-                if 'pan' in filename.lower() or any(filename.endswith(ext) for ext in ['.jpg', '.jpeg', '.png'] if len(filename) == 14):
-                    doc_type = 'pan'
-                elif 'aadhar' in filename.lower() or 'aadhaar' in filename.lower():
-                    doc_type = 'aadhaar'
-                elif 'gst' in filename.lower():
-                    doc_type = 'gst'
-                
-                file_format = 'pdf' if filename.lower().endswith('.pdf') else 'image'
-                
-                documents.append({
-                    'name': filename,
-                    'path': f'/static/uploads/{filename}',
-                    'size': size_str,
-                    'date': date_str,
-                    'type': doc_type,
-                    'format': file_format
-                })
-        
-        documents.sort(key=lambda x: x['date'], reverse=True)
-    
-    return render_template('gallery.html', documents=documents)
+
+    doc_type = request.args.get('type', 'all')
+    search = request.args.get('q', '').strip()
+    page = max(request.args.get('page', 1, type=int), 1)
+
+    rows, total = upload_catalog.list_uploads(doc_type, search, page)
+    documents = [{
+        'name': row['filename'],
+        'path': '/' + row['path'],
+        'size': format_size(row['size']),
+        'date': datetime.fromtimestamp(row['mtime']).strftime('%Y-%m-%d %H:%M'),
+        'type': row['doc_type'],
+        'format': row['format'],
+        'status': row['status'],
+        'thumbnail': url_for('thumbnail', digest=row['digest'])
+    } for row in rows]
+
+    pages = max((total + upload_catalog.PAGE_SIZE - 1) // upload_catalog.PAGE_SIZE, 1)
+    return render_template('gallery.html', documents=documents, total=total, page=page, pages=pages,
+                           doc_type=doc_type, search=search)
+
+@app.route('/thumbnails/<digest>.jpg')
+def thumbnail(digest):
+    if not os.path.exists(thumbnails.thumbnail_path(digest)):
+        # Uploads from before thumbnails existed, or whose job has not run yet
+        upload = upload_catalog.get_upload(digest)
+        if upload is None or not os.path.exists(upload['path']):
+            return render_template('404.html'), 404
+        try:
+            thumbnails.generate_thumbnail(upload['path'], digest)
+        except Exception as e:
+            print(f"Thumbnail error for {upload['path']}: {e}")
+            return render_template('404.html'), 404
+    return send_from_directory(thumbnails.THUMBNAIL_DIR, f"{digest}.jpg", max_age=thumbnails.THUMBNAIL_MAX_AGE)
+
+OCR_STAGES = ['ocr']
+THUMBNAIL_STAGES = ['thumbnail']
+VERIFY_STAGES = ['ocr', 'verification', 'learning']
+
+def get_session_id():
+    if 'kb_session' not in session:
+        session['kb_session'] = uuid.uuid4().hex
+    return session['kb_session']
+
+def store_upload(file):
+    """Save an uploaded file, catalog it and queue its gallery thumbnail."""
+    stored = upload_store.save_upload(file)
+    upload_catalog.record_upload(stored)
+    if not os.path.exists(thumbnails.thumbnail_path(stored.digest)):
+        job_queue.submit_background('thumbnail', THUMBNAIL_STAGES, thumbnails.run_thumbnail_job,
+                                    stored.filepath, stored.digest)
+    return stored
+
+def wants_async():
+    flag = request.args.get('async') or request.form.get('async') or ''
+    return flag.lower() in ('1', 'true', 'yes')
+
+# upload_catalog's doc types -> ocr_engine doc types (preprocessing profile and early exit)
+OCR_DOC_TYPES = {'pan': 'PAN', 'aadhaar': 'AADHAAR', 'gst': 'GST'}
+
+def ocr_doc_type(filename, requested=None):
+    """The OCR doc type asked for in the request, else guessed from the file name; None if unknown."""
+    requested = (requested or '').strip().lower()
+    if requested in OCR_DOC_TYPES:
+        return OCR_DOC_TYPES[requested]
+    return OCR_DOC_TYPES.get(upload_catalog.guess_doc_type(filename))
+
+def run_ocr_pipeline(job, uploads):
+    results = []
+    job.start_stage('ocr')
+    for position, (filepath, web_image_path, content_hash, doc_type) in enumerate(uploads, start=1):
+        # Only a known PAN or Aadhaar upload stops at the page carrying its number
+        text = ocr_engine.extract_text(filepath, content_hash=content_hash, doc_type=doc_type)
+        job.update_pages(position, len(uploads))
+
+        verification = verify_pan_card(text)
+        if verification['status'] == 'Valid':
+            upload_catalog.set_status(content_hash, 'verified', 'pan')
+        else:
+            upload_catalog.set_status(content_hash, 'processed')
+
+        results.append({
+            'image_path': web_image_path,
+            'extracted_text': text.strip(),
+            'verification': verification
+        })
+    job.finish_stage()
+    return {'status': 'success', 'results': results}
 
 @app.route('/ocr', methods=['POST'])
 def ocr_upload():
@@ -103,49 +221,33 @@ def ocr_upload():
              request.files.get('document2'),
              request.files.get('document3')]
 
-    upload_folder = os.path.join('static', 'uploads')
-    os.makedirs(upload_folder, exist_ok=True)
-
-    results = []
+    uploads = []
 
     for file in files:
         if file and file.filename:
-            filepath = os.path.join(upload_folder, file.filename)
-            file.save(filepath)
-
-            text = ""
-            if file.filename.lower().endswith('.pdf'):
-                from PIL import ImageEnhance
-                poppler_path = os.path.join(os.getcwd(), 'poppler-25.07.0', 'Library', 'bin')
-                pages = convert_from_path(filepath, poppler_path=poppler_path, dpi=300)
-                for page in pages:
-                    page = page.convert('L')
-                    enhancer = ImageEnhance.Contrast(page)
-                    page = enhancer.enhance(2.0)
-                    enhancer = ImageEnhance.Sharpness(page)
-                    page = enhancer.enhance(1.5)
-                    text += pytesseract.image_to_string(page, config='--psm 6 --oem 3')
-            else:
-                from PIL import ImageEnhance
-                image = Image.open(filepath)
-                image = image.convert('L')
-                enhancer = ImageEnhance.Contrast(image)
-                image = enhancer.enhance(2.0)
-                enhancer = ImageEnhance.Sharpness(image)
-                image = enhancer.enhance(1.5)
-                text = pytesseract.image_to_string(image, config='--psm 6 --oem 3')
-
-            web_image_path = filepath.replace('\\', '/')
-            
-            verification_result = verify_pan_card(text)
-            
-            results.append({
-                'image_path': web_image_path,
-                'extracted_text': text.strip(),
-                'verification': verification_result
-            })
-
-    return render_template('result.html', results=results)
+            try:
+                stored = store_upload(file)
+            except upload_store.UploadTooLarge as e:
+                return render_template('result.html', results=[],
+                                       job={'status': 'failed', 'error': str(e)}), 413
+            except upload_store.UnsupportedUpload as e:
+                return render_template('result.html', results=[],
+                                       job={'status': 'failed', 'error': str(e)}), 400
+            uploads.append((stored.filepath, stored.filepath.replace('\\', '/'), stored.digest,
+                            ocr_doc_type(stored.filename, request.form.get('doc_type'))))
+
+    job = job_queue.submit('ocr', OCR_STAGES, run_ocr_pipeline, uploads)
+    return redirect(url_for('ocr_results', job_id=job.id))
+
+@app.route('/ocr/results/<job_id>')
+def ocr_results(job_id):
+    job = job_queue.get_job(job_id)
+    if job is None:
+        return render_template('404.html'), 404
+
+    if job.status == 'done':
+        return render_template('result.html', results=job.result['results'])
+    return render_template('result.html', results=[], job=job.to_dict())
 
 def verify_pan_card(ocr_text):
     if not ocr_text:
@@ -179,35 +281,66 @@ def api_ocr_upload():
         return jsonify({'error': 'No selected file'}), 400
 
     if file:
-        upload_folder = os.path.join('static', 'uploads')
-        os.makedirs(upload_folder, exist_ok=True)
-        
-        filepath = os.path.join(upload_folder, file.filename)
-        file.save(filepath)
-
-        text = ""
-        if file.filename.lower().endswith('.pdf'):
-            poppler_path = os.path.join(os.getcwd(), 'poppler-25.07.0', 'Library', 'bin')
-            pages = convert_from_path(filepath, poppler_path=poppler_path)
-            for page in pages:
-                text += pytesseract.image_to_string(page)
-        else:
-            image = Image.open(filepath)
-            text = pytesseract.image_to_string(image)
-
-        web_image_path = '/' + filepath.replace('\\', '/')
-        
-        verification_result = verify_pan_card(text)
+        try:
+            stored = store_upload(file)
+        except upload_store.UploadTooLarge as e:
+            return jsonify({'error': str(e)}), 413
+        except upload_store.UnsupportedUpload as e:
+            return jsonify({'error': str(e)}), 400
+
+        web_image_path = '/' + stored.filepath.replace('\\', '/')
+        doc_type = ocr_doc_type(stored.filename, request.form.get('doc_type') or request.args.get('doc_type'))
+        uploads = [(stored.filepath, web_image_path, stored.digest, doc_type)]
+
+        if wants_async():
+            job = job_queue.submit('ocr', OCR_STAGES, run_ocr_pipeline, uploads)
+            return jsonify({'status': 'queued', 'job_id': job.id,
+                            'status_url': url_for('job_status', job_id=job.id)}), 202
+
+        result = run_ocr_pipeline(job_queue.Job('ocr', OCR_STAGES), uploads)['results'][0]
         
         return jsonify({
             'status': 'success',
-            'image_path': web_image_path,
-            'extracted_text': text.strip(),
-            'verification': verification_result
+            'image_path': result['image_path'],
+            'extracted_text': result['extracted_text'],
+            'verification': result['verification']
         })
 
     return jsonify({'error': 'Unknown error'}), 500
 
+def run_verification_pipeline(job, filepath, filename, session_id, content_hash=None):
+    job.start_stage('ocr')
+    try:
+        text = ocr_engine.extract_text(filepath, on_page=job.update_pages, content_hash=content_hash)
+    except Exception as e:
+        job.finish_stage(status='failed')
+        return {'error': f'Failed to extract text: {str(e)}'}
+    job.finish_stage()
+
+    web_image_path = '/' + filepath.replace('\\', '/')
+    
+    job.start_stage('verification')
+    verification_report = generate_verification_report(text, filename, filepath)
+    verification_report['image_path'] = web_image_path
+    if content_hash:
+        upload_catalog.record_verification(content_hash, verification_report)
+    job.finish_stage()
+    
+    job.start_stage('learning')
+    chatbot_logic.clear_knowledge_base(session_id)
+    success, message = chatbot_logic.add_document_to_knowledge_base(filepath, filename, session_id)
+    if success:
+        verification_report['learning_status'] = "Document successfully learned by the chatbot!"
+    else:
+        verification_report['learning_status'] = f"Warning: Could not learn document ({message})"
+    job.finish_stage()
+
+    return {
+        'status': 'success',
+        'verification': verification_report,
+        'extracted_text': text.strip()
+    }
+
 @app.route('/api/verify-document', methods=['POST'])
 def verify_document():
     if 'file' not in request.files:
@@ -219,45 +352,66 @@ def verify_document():
         return jsonify({'error': 'No selected file'}), 400
 
     if file:
-        upload_folder = os.path.join('static', 'uploads')
-        os.makedirs(upload_folder, exist_ok=True)
-        
-        filepath = os.path.join(upload_folder, file.filename)
-        file.save(filepath)
-
-        text = ""
         try:
-            if file.filename.lower().endswith('.pdf'):
-                poppler_path = os.path.join(os.getcwd(), 'poppler-25.07.0', 'Library', 'bin')
-                pages = convert_from_path(filepath, poppler_path=poppler_path)
-                for page in pages:
-                    text += pytesseract.image_to_string(page)
-            else:
-                image = Image.open(filepath)
-                text = pytesseract.image_to_string(image)
-        except Exception as e:
-            return jsonify({'error': f'Failed to extract text: {str(e)}'}), 500
-
-        web_image_path = '/' + filepath.replace('\\', '/')
-        
-        verification_report = generate_verification_report(text, file.filename)
-        verification_report['image_path'] = web_image_path
-        
-        chatbot_logic.clear_knowledge_base()
-        success, message = chatbot_logic.add_document_to_knowledge_base(filepath, file.filename)
-        if success:
-            verification_report['learning_status'] = "Document successfully learned by the chatbot!"
-        else:
-            verification_report['learning_status'] = f"Warning: Could not learn document ({message})"
-
-        return jsonify({
-            'status': 'success',
-            'verification': verification_report,
-            'extracted_text': text.strip()
-        })
+            stored = store_upload(file)
+        except upload_store.UploadTooLarge as e:
+            return jsonify({'error': str(e)}), 413
+        except upload_store.UnsupportedUpload as e:
+            return jsonify({'error': str(e)}), 400
+
+        if wants_async():
+            job = job_queue.submit('verify-document', VERIFY_STAGES, run_verification_pipeline,
+                                   stored.filepath, stored.filename, get_session_id(), stored.digest)
+            return jsonify({'status': 'queued', 'job_id': job.id,
+                            'status_url': url_for('job_status', job_id=job.id)}), 202
+
+        result = run_verification_pipeline(job_queue.Job('verify-document', VERIFY_STAGES),
+                                           stored.filepath, stored.filename, get_session_id(), stored.digest)
+        if 'error' in result:
+            return jsonify(result), 500
+        return jsonify(result)
 
     return jsonify({'error': 'Unknown error'}), 500
 
+@app.errorhandler(413)
+def request_too_large(e):
+    limit_mb = upload_store.MAX_UPLOAD_BYTES // (1024 * 1024)
+    message = f"Upload is too large (limit {limit_mb} MB per file)"
+    if request.path.startswith('/api/'):
+        return jsonify({'error': message}), 413
+    return render_template('result.html', results=[], job={'status': 'failed', 'error': message}), 413
+
+@app.route('/api/jobs/<job_id>')
+def job_status(job_id):
+    job = job_queue.get_job(job_id)
+    if job is None:
+        return jsonify({'error': 'Unknown job id'}), 404
+    return jsonify(job.to_dict())
+
+@app.route('/api/gst/<gstin>')
+def gst_lookup(gstin):
+    gstin = gstin.strip().upper()
+    registration = gst_registry.lookup(gstin)
+    if registration:
+        return jsonify({'gstin': gstin, 'known': True, 'registration': registration})
+    if not gst_extractor.is_valid_gstin(gstin):
+        return jsonify({'gstin': gstin, 'known': False, 'error': 'Not a valid GSTIN (format or checksum)'}), 400
+    return jsonify({'gstin': gstin, 'known': False}), 404
+
+@app.route('/api/gst/pan/<pan>')
+def gst_by_pan(pan):
+    registrations = gst_registry.find_by_pan(pan)
+    return jsonify({'pan': pan.strip().upper(), 'count': len(registrations), 'registrations': registrations})
+
+@app.route('/api/gst/search')
+def gst_search():
+    query = request.args.get('q', '').strip()
+    if not query:
+        return jsonify({'error': 'Missing search query'}), 400
+    limit = min(request.args.get('limit', gst_registry.SEARCH_LIMIT, type=int), 100)
+    results = gst_registry.search(query, limit)
+    return jsonify({'query': query, 'count': len(results), 'results': results})
+
 @app.route('/api/chat', methods=['POST'])
 def chat():
     data = request.json
@@ -266,10 +420,31 @@ def chat():
     if not user_message:
         return jsonify({'response': 'Please say something!'})
         
-    response = chatbot_logic.query_chatbot(user_message)
+    response = chatbot_logic.query_chatbot(user_message, get_session_id())
     return jsonify({'response': response})
 
-def generate_verification_report(text, filename):
+@app.route('/api/chat/stream', methods=['POST'])
+def chat_stream():
+    data = request.json
+    user_message = data.get('message', '')
+    session_id = get_session_id()
+
+    def generate():
+        if not user_message:
+            yield sse_event({'token': 'Please say something!'})
+        else:
+            for token in chatbot_logic.stream_chatbot(user_message, session_id):
+                yield sse_event({'token': token})
+        yield sse_event({}, event='done')
+
+    return Response(stream_with_context(generate()), mimetype='text/event-stream',
+                    headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'})
+
+def sse_event(data, event=None):
+    message = f"event: {event}\n" if event else ""
+    return message + f"data: {json.dumps(data)}\n\n"
+
+def generate_verification_report(text, filename, filepath=None):
     doc_type = "Document"
     is_pan_document = False
     is_aadhaar_document = False
@@ -284,9 +459,11 @@ def generate_verification_report(text, filename):
         doc_type = "GST Certificate"
     
     authenticity_result = None
-    if authenticity_detector and (is_pan_document or is_aadhaar_document):
+    authenticity_detector = get_authenticity_detector() if (is_pan_document or is_aadhaar_document) else None
+    if authenticity_detector:
         try:
-            filepath = f"static/uploads/{filename}" if not filename.startswith("static") else filename
+            if filepath is None:
+                filepath = f"static/uploads/{filename}" if not filename.startswith("static") else filename
             if os.path.exists(filepath):
                 doc_type_for_check = "PAN" if is_pan_document else "AADHAAR"
                 authenticity_result = authenticity_detector.verify_document(filepath, doc_type_for_check)
@@ -0,0 +1,68 @@
+"""
+Bulk authenticity audit of already-uploaded documents.
+
+USAGE:
+    python audit_documents.py                      # audits static/uploads
+    python audit_documents.py path/to/folder --output audit.jsonl
+
+Each PAN / Aadhaar file found is verified against the trained authenticity
+index and one JSON line per file is written to the output file as results
+come in.
+"""
+
+import os
+import sys
+import json
+import argparse
+from train_authenticity_model import DocumentAuthenticityDetector
+
+SUPPORTED_EXTENSIONS = ('.pdf', '.jpg', '.jpeg', '.png')
+
+def guess_doc_type(filename):
+    name = filename.lower()
+    if 'aadhar' in name or 'aadhaar' in name:
+        return "AADHAAR"
+    if 'pan' in name or (len(filename) == 14 and name.endswith(('.jpg', '.jpeg', '.png'))):
+        return "PAN"
+    return None
+
+def collect_documents(folder):
+    documents = []
+    for filename in sorted(os.listdir(folder)):
+        filepath = os.path.join(folder, filename)
+        if not os.path.isfile(filepath) or not filename.lower().endswith(SUPPORTED_EXTENSIONS):
+            continue
+        doc_type = guess_doc_type(filename)
+        if doc_type:
+            documents.append((filepath, doc_type))
+    return documents
+
+def main():
+    parser = argparse.ArgumentParser(description="Verify many uploaded documents in one run.")
+    parser.add_argument('folder', nargs='?', default=os.path.join('static', 'uploads'))
+    parser.add_argument('--output', default='audit_results.jsonl')
+    parser.add_argument('--batch-size', type=int, default=64)
+    args = parser.parse_args()
+
+    documents = collect_documents(args.folder)
+    if not documents:
+        print(f"No PAN or Aadhaar documents found in '{args.folder}'.")
+        return False
+
+    detector = DocumentAuthenticityDetector()
+    print(f"Auditing {len(documents)} documents...")
+
+    suspicious = 0
+    with open(args.output, "w", encoding="utf-8") as out:
+        for done, (filepath, doc_type, result) in enumerate(
+                detector.verify_documents(documents, batch_size=args.batch_size), start=1):
+            if not result["is_authentic"]:
+                suspicious += 1
+            out.write(json.dumps({"filepath": filepath, "doc_type": doc_type, **result}, default=str) + "\n")
+            print(f"  [{done}/{len(documents)}] {doc_type} {filepath}: {result['reason']}")
+
+    print(f"\nDone. {suspicious} of {len(documents)} documents flagged. Results written to '{args.output}'.")
+    return True
+
+if __name__ == "__main__":
+    sys.exit(0 if main() else 1)
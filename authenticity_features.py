@@ -0,0 +1,142 @@
+import re
+import numpy as np
+
+# Version 1 padded every vector with zeros to 100 floats. Version 2 stores
+# only the real features: the doc type's rule flags followed by the generic
+# text statistics, each multiplied by its scale.
+SCHEMA_VERSION = 2
+LEGACY_VECTOR_DIMENSION = 100
+GENERIC_FEATURES = ['text_length', 'word_count', 'uppercase_ratio', 'digit_ratio']
+
+DOB_PATTERN = re.compile(r'\d{2}/\d{2}/\d{4}')
+
+# Per doc type, in feature order: ('regex', pattern) is searched in the raw
+# text, ('keyword', words) is true if any of the words appears in the
+# upper-cased text.
+FEATURE_RULES = {
+    "PAN": [
+        ('regex', re.compile(r'[A-Z]{5}[0-9]{4}[A-Z]{1}')),
+        ('keyword', ['PERMANENT ACCOUNT NUMBER']),
+        ('keyword', ['INCOME TAX DEPARTMENT']),
+        ('keyword', ['GOVT. OF INDIA']),
+        ('regex', DOB_PATTERN),
+        ('regex', re.compile(r'[A-Z][a-z]+ [A-Z][a-z]+')),
+    ],
+    "AADHAAR": [
+        ('regex', re.compile(r'\d{4}\s\d{4}\s\d{4}')),
+        ('keyword', ['UIDAI']),
+        ('keyword', ['UNIQUE IDENTIFICATION']),
+        ('keyword', ['AADHAAR']),
+        ('regex', DOB_PATTERN),
+        ('keyword', ['S/O', 'D/O', 'W/O', 'C/O']),
+    ],
+}
+
+KEYWORD_SLOTS = {doc_type: [(slot, value) for slot, (kind, value) in enumerate(rules) if kind == 'keyword']
+                 for doc_type, rules in FEATURE_RULES.items()}
+REGEX_SLOTS = {doc_type: [(slot, value) for slot, (kind, value) in enumerate(rules) if kind == 'regex']
+               for doc_type, rules in FEATURE_RULES.items()}
+
+# Code point -> character class bits for latin-1; the rare characters above
+# U+00FF are classified individually so counts match the str methods exactly.
+UPPER, DIGIT, SPACE = 1, 2, 4
+
+def _class_bits(c):
+    return (UPPER if c.isupper() else 0) | (DIGIT if c.isdigit() else 0) | (SPACE if c.isspace() else 0)
+
+CLASS_TABLE = np.array([_class_bits(chr(code)) for code in range(256)], dtype=np.uint8)
+
+def _character_stats(text):
+    """Return (word count, uppercase count, digit count) from one pass over the code points."""
+    codes = np.frombuffer(text.encode('utf-32-le'), dtype=np.uint32)
+    if codes.size == 0:
+        return 0, 0, 0
+
+    if int(codes.max()) < 256:
+        classes = CLASS_TABLE[codes]
+    else:
+        classes = np.empty(codes.shape, dtype=np.uint8)
+        narrow = codes < 256
+        classes[narrow] = CLASS_TABLE[codes[narrow]]
+        values, inverse = np.unique(codes[~narrow], return_inverse=True)
+        classes[~narrow] = np.array([_class_bits(chr(value)) for value in values], dtype=np.uint8)[inverse]
+
+    histogram = np.bincount(classes, minlength=8)
+    uppercase = int(histogram[[UPPER, UPPER | DIGIT, UPPER | SPACE, 7]].sum())
+    digits = int(histogram[[DIGIT, UPPER | DIGIT, DIGIT | SPACE, 7]].sum())
+
+    in_word = (classes & SPACE) == 0
+    words = int(in_word[0]) + int(np.count_nonzero(in_word[1:] > in_word[:-1]))
+    return words, uppercase, digits
+
+def feature_dimension(doc_type):
+    return len(FEATURE_RULES.get(doc_type, [])) + len(GENERIC_FEATURES)
+
+# All ones keeps distances identical to the version 1 vectors, which the
+# similarity threshold was tuned on; raise a weight to make that feature count more.
+FEATURE_SCALES = {doc_type: np.ones(feature_dimension(doc_type), dtype=np.float32)
+                  for doc_type in FEATURE_RULES}
+
+def feature_scales(doc_type):
+    scales = FEATURE_SCALES.get(doc_type)
+    if scales is None:
+        scales = FEATURE_SCALES[doc_type] = np.ones(feature_dimension(doc_type), dtype=np.float32)
+    return scales
+
+def fill_features(out, text, doc_type):
+    """Write the scaled feature vector for text into the preallocated float32 row out."""
+    out[:] = 0.0
+    rules = FEATURE_RULES.get(doc_type, [])
+
+    for slot, pattern in REGEX_SLOTS.get(doc_type, []):
+        if pattern.search(text):
+            out[slot] = 1.0
+
+    keyword_slots = KEYWORD_SLOTS.get(doc_type)
+    if keyword_slots:
+        upper_text = text.upper()
+        for slot, words in keyword_slots:
+            if any(word in upper_text for word in words):
+                out[slot] = 1.0
+
+    text_length = len(text)
+    words, uppercase, digits = _character_stats(text)
+    position = len(rules)
+    out[position] = min(text_length / 1000.0, 1.0)
+    out[position + 1] = min(words / 100.0, 1.0)
+    out[position + 2] = uppercase / max(text_length, 1)
+    out[position + 3] = digits / max(text_length, 1)
+
+    dimension = feature_dimension(doc_type)
+    out[:dimension] *= feature_scales(doc_type)
+    return out
+
+def extract_features(text, doc_type):
+    return fill_features(np.zeros(feature_dimension(doc_type), dtype=np.float32), text, doc_type)
+
+def extract_features_batch(texts, doc_types):
+    """Return one float32 matrix with a row per text.
+
+    Rows are as wide as the widest doc type requested; narrower rows are
+    zero-filled at the end.
+    """
+    if isinstance(doc_types, str):
+        doc_types = [doc_types] * len(texts)
+    width = max((feature_dimension(doc_type) for doc_type in doc_types), default=0)
+    matrix = np.zeros((len(texts), width), dtype=np.float32)
+    for row, (text, doc_type) in enumerate(zip(texts, doc_types)):
+        fill_features(matrix[row], text, doc_type)
+    return matrix
+
+def migrate_vectors(vectors, doc_type, from_version):
+    """Convert stored reference vectors of an older schema to the current one."""
+    vectors = np.asarray(vectors, dtype=np.float32)
+    if from_version == SCHEMA_VERSION:
+        return vectors
+    if from_version == 1:
+        # v1 features are the same values in the same order, then zero padding
+        if vectors.shape[1] != LEGACY_VECTOR_DIMENSION:
+            raise ValueError(f"Expected {LEGACY_VECTOR_DIMENSION}-dim v1 vectors, got {vectors.shape[1]}")
+        dimension = feature_dimension(doc_type)
+        return np.ascontiguousarray(vectors[:, :dimension] * feature_scales(doc_type))
+    raise ValueError(f"Unknown authenticity feature schema version {from_version}")
@@ -0,0 +1,36 @@
+"""
+Load gst_metadata.db into the GST registry (gst_registry.db).
+
+USAGE:
+    python build_gst_registry.py
+    python build_gst_registry.py --metadata path/to/gst_metadata.db
+    python build_gst_registry.py --metadata path/to/gst_metadata.pkl
+
+ocrmodel/GSTocr.py keeps the registry up to date as it indexes, and the
+app imports the metadata file once on first start. Run this to reload
+the registry after a crash or after editing the metadata by hand.
+Entries without a valid GSTIN are left out of the registry.
+"""
+
+import os
+import argparse
+import gst_registry
+import metadata_store
+
+def main():
+    parser = argparse.ArgumentParser(description="Load GST metadata into the GST registry.")
+    parser.add_argument('--metadata', default=gst_registry.GST_METADATA_FILE)
+    args = parser.parse_args()
+
+    if not os.path.exists(args.metadata):
+        print(f"Error: Could not find metadata file '{args.metadata}'.")
+        return False
+
+    metadata = metadata_store.open_metadata(args.metadata)
+    stored = gst_registry.import_metadata(metadata)
+    print(f"Stored {stored} of {len(metadata)} entries in '{gst_registry.REGISTRY_DB}' "
+          f"({len(metadata) - stored} had no valid GSTIN).")
+    return True
+
+if __name__ == "__main__":
+    main()
@@ -1,66 +1,189 @@
 import os
+import threading
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor, as_completed
 import numpy as np
 import faiss
 import pickle
 import ollama
-import pytesseract
-from pdf2image import convert_from_path
-from PIL import Image
+import ocr_engine
+import chunker
+import kb_store
+import vector_index
+import answer_cache
 
 TEXT_MODEL_NAME = 'qwen:1.8b'
 EMBEDDING_MODEL_NAME = 'qwen:1.8b'
 VECTOR_DIMENSION = 2048
 INDEX_FILE = "chatbot_index.faiss"
 METADATA_FILE = "chatbot_metadata.pkl"
-POPPLER_PATH = os.path.join(os.getcwd(), 'poppler-25.07.0', 'Library', 'bin')
-TESSERACT_PATH = r'C:\Program Files\Tesseract-OCR\tesseract.exe'
-pytesseract.pytesseract.tesseract_cmd = TESSERACT_PATH
+STORE_DIR = "chatbot_kb"
+# The shared manuals; only their rows may come into the base corpus from the
+# legacy index, which otherwise holds whatever a user last uploaded
+REFERENCE_DOCUMENTS = ("User_Manual_Bronze_Certification_20.04.2022.pdf", "General Instructions.pdf")
+EMBEDDING_BATCH_SIZE = int(os.environ.get('EMBEDDING_BATCH_SIZE', 16))
+EMBEDDING_CONCURRENCY = int(os.environ.get('EMBEDDING_CONCURRENCY', 2))
+MAX_SESSION_KBS = int(os.environ.get('MAX_SESSION_KBS', 64))
 
-index = None
-metadata_store = {}
+base_kb = None
+session_kbs = OrderedDict()
+_sessions_lock = threading.Lock()
+_init_lock = threading.Lock()
+
+class KnowledgeBase:
+    """One FAISS index plus its metadata rows, optionally backed by a SegmentStore.
+
+    The shared base corpus (manuals) is persisted under STORE_DIR and reads
+    its rows from the store's SQLite file by vector id; per-session overlays
+    that hold a user's own uploads live in memory only.
+    """
+
+    def __init__(self, name, directory=None, index_type=None):
+        self.name = name
+        self.index = vector_index.VectorIndex(VECTOR_DIMENSION, index_type)
+        self.store = kb_store.SegmentStore(directory) if directory else None
+        self.metadata_store = self.store.metadata if self.store else {}
+        self.lock = threading.RLock()
+
+    def load(self):
+        with self.lock:
+            self.index.reset()
+            if self.store is None:
+                self.metadata_store = {}
+                return
+            
+            if not self.store.is_empty() and self.store.embedding != embedding_space():
+                self._reembed()
+            
+            snapshot, covered = self.store.read_index_snapshot(self.index.index_type)
+            if snapshot is not None:
+                self.index.adopt(snapshot)
+            
+            for name, vectors in self.store.load():
+                if name not in covered:
+                    self.index.add(np.ascontiguousarray(vectors))
+
+    def _reembed(self):
+        """Re-embed every stored row so the index holds vectors from the current embedding endpoint only."""
+        print(f"Re-embedding knowledge base '{self.name}' for {embedding_space()} "
+              f"(stored vectors are from {self.store.embedding or 'an older endpoint'})...")
+        rows = [self.metadata_store.get(vector_id) or {"content": ""} for vector_id in range(self.store.row_count)]
+        vectors, kept, last_error = embed_texts([chunker.embedding_text(row) for row in rows])
+        if len(kept) < len(rows):
+            # Mixing the two spaces would make every similarity score meaningless
+            raise RuntimeError(f"Could not re-embed {len(rows) - len(kept)} knowledge base rows: {last_error}")
+        self.store.replace_vectors(vectors, embedding_space())
+
+    def write_snapshot(self):
+        with self.lock:
+            self.store.write_index_snapshot(self.index.index, self.index.index_type)
+
+    def add(self, vectors, rows):
+        with self.lock:
+            first_id = self.index.ntotal
+            # Index first: a segment on disk that the index rejected would fail every later load
+            self.index.add(vectors)
+            if self.store:
+                try:
+                    self.store.append(vectors, rows, embedding_space())
+                except Exception:
+                    # Drop the vectors just added so ids stay in step with the store
+                    self.load()
+                    raise
+            else:
+                for offset, row in enumerate(rows):
+                    self.metadata_store[first_id + offset] = row
+        answer_cache.invalidate(self.name)
+        if self.store:
+            self.store.maybe_compact_in_background()
+
+    def clear(self):
+        with self.lock:
+            self.index.reset()
+            if self.store:
+                self.store.clear()
+            else:
+                self.metadata_store = {}
+        answer_cache.invalidate(self.name)
+
+    def search(self, query_vector, k):
+        with self.lock:
+            if self.index.ntotal == 0:
+                return []
+            distances, indices = self.index.search(query_vector, k)
+            hits = [(float(distance), (self.name, int(idx)), self.metadata_store.get(int(idx)))
+                    for distance, idx in zip(distances[0], indices[0]) if idx != -1]
+            return [hit for hit in hits if hit[2] is not None]
+
+def import_legacy_knowledge_base(kb):
+    """Copy the reference manuals' rows from the legacy index into the base store.
+
+    Rows from users' own uploads (ID cards and the like) are left behind so
+    they never become retrievable from every session.
+    """
+    print("Migrating legacy chatbot index into segment store...")
+    legacy_index = faiss.read_index(INDEX_FILE)
+    with open(METADATA_FILE, "rb") as f:
+        legacy_metadata = pickle.load(f)
+    rows = [legacy_metadata[vector_id] for vector_id in range(legacy_index.ntotal)
+            if legacy_metadata.get(vector_id, {}).get("filename") in REFERENCE_DOCUMENTS]
+    skipped = legacy_index.ntotal - len(rows)
+    if skipped:
+        print(f"Left out {skipped} legacy rows that are not from the reference manuals.")
+    if not rows:
+        return
+    # The legacy vectors came from the older /api/embeddings endpoint; embed the text again
+    vectors, kept, last_error = embed_texts([row["content"] for row in rows])
+    if len(kept) < len(rows):
+        print(f"Could not embed {len(rows) - len(kept)} legacy rows: {last_error}")
+    if kept:
+        kb.store.append(vectors, [rows[position] for position in kept], embedding_space())
 
 def init_chatbot():
-    global index, metadata_store
+    global base_kb
     
-    if os.path.exists(INDEX_FILE) and os.path.exists(METADATA_FILE):
-        print("Loading existing chatbot index...")
-        index = faiss.read_index(INDEX_FILE)
-        with open(METADATA_FILE, "rb") as f:
-            metadata_store = pickle.load(f)
-    else:
-        print("Creating new chatbot index...")
-        index = faiss.IndexFlatL2(VECTOR_DIMENSION)
-        metadata_store = {}
+    kb = KnowledgeBase("base", STORE_DIR)
+    if kb.store.is_empty() and not os.path.exists(kb.store.manifest_path) \
+            and os.path.exists(INDEX_FILE) and os.path.exists(METADATA_FILE):
+        import_legacy_knowledge_base(kb)
+    
+    print("Loading chatbot knowledge base segments...")
+    kb.load()
+    base_kb = kb
+
+def get_base_kb():
+    if base_kb is None:
+        with _init_lock:
+            if base_kb is None:
+                init_chatbot()
+    return base_kb
+
+def warm_up_models():
+    """Ask Ollama to load both models now rather than on the first question."""
+    embed_batch(["warm up"])
+    ollama.generate(model=TEXT_MODEL_NAME, prompt="")
+
+def get_session_kb(session_id, create=True):
+    with _sessions_lock:
+        kb = session_kbs.get(session_id)
+        if kb is not None:
+            session_kbs.move_to_end(session_id)
+        elif create:
+            # Overlays hold a handful of chunks; brute force is fastest there
+            kb = KnowledgeBase(f"session:{session_id}", index_type='flat')
+            session_kbs[session_id] = kb
+            while len(session_kbs) > MAX_SESSION_KBS:
+                session_kbs.popitem(last=False)
+        return kb
+
+def get_target_kb(session_id):
+    return get_session_kb(session_id) if session_id else get_base_kb()
 
 def extract_text_from_file(filepath):
-    from PIL import ImageEnhance
-    
-    text = ""
     try:
-        if filepath.lower().endswith('.pdf'):
-            pages = convert_from_path(filepath, poppler_path=POPPLER_PATH, dpi=300)
-            for page in pages:
-                page = page.convert('L')
-                
-                enhancer = ImageEnhance.Contrast(page)
-                page = enhancer.enhance(2.0)
-                
-                enhancer = ImageEnhance.Sharpness(page)
-                page = enhancer.enhance(1.5)
-                
-                page_text = pytesseract.image_to_string(page, config='--psm 6 --oem 3')
-                text += page_text + "\n"
-        else:
-            image = Image.open(filepath)
-            image = image.convert('L')
-            
-            enhancer = ImageEnhance.Contrast(image)
-            image = enhancer.enhance(2.0)
-            
-            enhancer = ImageEnhance.Sharpness(image)
-            image = enhancer.enhance(1.5)
-            
-            text = pytesseract.image_to_string(image, config='--psm 6 --oem 3')
+        # Born-digital PDFs (the manuals, portal-issued GST certificates) are
+        # read from their text layer; only scanned pages go through OCR.
+        text = ocr_engine.extract_text(filepath, text_layer=True)
     except Exception as e:
         print(f"Error extracting text from {filepath}: {e}")
         return None
@@ -72,92 +195,158 @@ def extract_text_from_file(filepath):
     print("--------------------------------------")
     return text.strip()
 
-def clear_knowledge_base():
-    global index, metadata_store
-    print("Clearing knowledge base...")
-    index = faiss.IndexFlatL2(VECTOR_DIMENSION)
-    metadata_store = {}
-    save_knowledge_base()
+def extract_pages_from_file(filepath):
+    """Per-page text for chunking, read the same way as extract_text_from_file."""
+    try:
+        pages = ocr_engine.extract_pages(filepath, text_layer=True)
+    except Exception as e:
+        print(f"Error extracting text from {filepath}: {e}")
+        return None
+    
+    print(f"--- Extracted {len(pages)} pages from {filepath} ---")
+    print(f"Length: {sum(len(page) for page in pages)} characters")
+    return pages
+
+def embedding_space():
+    """Names the endpoint and model vectors come from; vectors from different ones can't share an index."""
+    return f"{'embed' if hasattr(ollama, 'embed') else 'embeddings'}:{EMBEDDING_MODEL_NAME}"
 
-def add_document_to_knowledge_base(filepath, filename):
-    global index, metadata_store
+def embed_batch(texts):
+    if hasattr(ollama, 'embed'):
+        result = ollama.embed(model=EMBEDDING_MODEL_NAME, input=texts)
+        return result['embeddings']
+    return [ollama.embeddings(model=EMBEDDING_MODEL_NAME, prompt=text)['embedding'] for text in texts]
+
+def embed_texts(texts, batch_size=None, concurrency=None):
+    """Embed texts in batches; returns (float32 matrix, positions embedded, last error)."""
+    batch_size = batch_size or EMBEDDING_BATCH_SIZE
+    concurrency = concurrency or EMBEDDING_CONCURRENCY
+    batches = [texts[i:i + batch_size] for i in range(0, len(texts), batch_size)]
+    batch_vectors = [None] * len(batches)
+    last_error = None
+
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        futures = {pool.submit(embed_batch, batch): position for position, batch in enumerate(batches)}
+        for future in as_completed(futures):
+            try:
+                batch_vectors[futures[future]] = future.result()
+            except Exception as e:
+                print(f"Error embedding batch: {e}")
+                last_error = str(e)
+
+    kept = []
+    for position, vectors in enumerate(batch_vectors):
+        if vectors is not None:
+            kept.extend(range(position * batch_size, position * batch_size + len(vectors)))
+
+    matrix = np.empty((len(kept), VECTOR_DIMENSION), dtype='float32')
+    row = 0
+    for vectors in batch_vectors:
+        if vectors is not None:
+            matrix[row:row + len(vectors)] = np.asarray(vectors, dtype='float32')
+            row += len(vectors)
+
+    return matrix, kept, last_error
+
+def clear_knowledge_base(session_id=None):
+    """Clear a session's overlay, or the shared base corpus when no session is given."""
+    kb = get_target_kb(session_id)
+    print(f"Clearing knowledge base ({kb.name})...")
+    kb.clear()
+
+def add_document_to_knowledge_base(filepath, filename, session_id=None):
+    kb = get_target_kb(session_id)
     
-    if index is None:
-        init_chatbot()
-        
-    text = extract_text_from_file(filepath)
-    if not text:
+    pages = extract_pages_from_file(filepath)
+    if not pages or not any(page.strip() for page in pages):
         return False, "Failed to extract text."
 
-    chunk_size = 500
-    overlap = 50
-    words = text.split()
-    chunks = []
-    for i in range(0, len(words), chunk_size - overlap):
-        chunk = ' '.join(words[i:i + chunk_size])
-        chunks.append(chunk)
+    # Sized in model tokens and split at headings and page breaks; each row
+    # records where its text came from instead of repeating the document's opening
+    chunks = chunker.chunk_pages(pages)
     
-    successful_chunks = 0
-    last_error = None
+    vectors, kept_chunks, last_error = embed_texts([chunker.embedding_text(chunk) for chunk in chunks])
+    successful_chunks = len(kept_chunks)
     
-    for chunk in chunks:
-        try:
-            result = ollama.embeddings(model=EMBEDDING_MODEL_NAME, prompt=chunk)
-            vector = result['embedding']
-            vector_np = np.array([vector]).astype('float32')
-            
-            vector_id = index.ntotal
-            index.add(vector_np)
-            
-            metadata_store[vector_id] = {
-                "filename": filename,
-                "content": chunk,
-                "full_text_snippet": text[:200] + "..."
-            }
-            successful_chunks += 1
-        except Exception as e:
-            print(f"Error embedding chunk: {e}")
-            last_error = str(e)
-            
     if successful_chunks > 0:
-        save_knowledge_base()
+        rows = [{
+            "filename": filename,
+            "content": chunks[chunk_position]["content"],
+            "section": chunks[chunk_position]["section"],
+            "page": chunks[chunk_position]["page"],
+            "page_end": chunks[chunk_position]["page_end"],
+            "start": chunks[chunk_position]["start"],
+            "end": chunks[chunk_position]["end"],
+        } for chunk_position in kept_chunks]
+        kb.add(vectors, rows)
         return True, f"Successfully learned {successful_chunks} chunks from {filename}."
     else:
         error_msg = f"Failed to learn content. Error: {last_error}" if last_error else "Failed to learn content."
         return False, error_msg
 
 def save_knowledge_base():
-    global index, metadata_store
-    if index:
-        faiss.write_index(index, INDEX_FILE)
-        with open(METADATA_FILE, "wb") as f:
-            pickle.dump(metadata_store, f)
-
-def query_chatbot(user_query):
-    global index, metadata_store
+    kb = get_base_kb()
+    with kb.lock:
+        kb.store.compact()
+
+def build_knowledge_base_artifact():
+    """Compact the base corpus into one segment and snapshot its built index.
+
+    The resulting STORE_DIR can be copied to other machines; workers then
+    memory-map it at boot instead of OCR-ing and embedding the manuals.
+    """
+    kb = get_base_kb()
+    with kb.lock:
+        kb.store.compact()
+        kb.write_snapshot()
+    return kb.index.ntotal
+
+def active_knowledge_bases(session_id=None):
+    knowledge_bases = [get_base_kb()]
+    overlay = get_session_kb(session_id, create=False) if session_id else None
+    if overlay is not None:
+        knowledge_bases.append(overlay)
+    return knowledge_bases
+
+def search_knowledge_bases(query_vector, knowledge_bases, k=3):
+    """Search every given knowledge base and merge the top-k hits as (context id, row)."""
+    hits = []
+    for kb in knowledge_bases:
+        hits.extend(kb.search(query_vector, k))
+    hits.sort(key=lambda hit: hit[0])
+    return [(context_id, row) for _, context_id, row in hits[:k]]
+
+def build_prompt(user_query, session_id=None):
+    """Return (prompt, reply, cache_entry).
+
+    reply is set instead of prompt when the model need not be asked: nothing
+    is learned yet, nothing relevant was found, or the answer is cached.
+    cache_entry carries what query_chatbot needs to cache the new answer.
+    """
+    knowledge_bases = active_knowledge_bases(session_id)
+    if all(kb.index.ntotal == 0 for kb in knowledge_bases):
+        return None, "I haven't learned any documents yet. Please upload one first!", None
+
+    query_vector = np.asarray(embed_batch([user_query]), dtype='float32')
+    namespaces = tuple(kb.name for kb in knowledge_bases)
+    
+    hits = search_knowledge_bases(query_vector, knowledge_bases, k=3)
+    if not hits:
+        return None, "I couldn't find any relevant information in the uploaded documents.", None
     
-    if index is None:
-        init_chatbot()
-        
-    if index.ntotal == 0:
-        return "I haven't learned any documents yet. Please upload one first!"
+    context_ids = [context_id for context_id, _ in hits]
+    cache_key = answer_cache.make_key(user_query, context_ids)
+    cached_answer = answer_cache.get(cache_key)
+    if cached_answer is None:
+        cached_answer = answer_cache.lookup_similar(query_vector[0], namespaces, context_ids)
+    if cached_answer is not None:
+        return None, cached_answer, None
+    
+    retrieved_context = ""
+    for _, row in hits:
+        retrieved_context += row['content'] + "\n---\n"
 
-    try:
-        result = ollama.embeddings(model=EMBEDDING_MODEL_NAME, prompt=user_query)
-        query_vector = np.array([result['embedding']]).astype('float32')
-        
-        k = 3
-        distances, indices = index.search(query_vector, k)
-        
-        retrieved_context = ""
-        for idx in indices[0]:
-            if idx != -1 and idx in metadata_store:
-                retrieved_context += metadata_store[idx]['content'] + "\n---\n"
-        
-        if not retrieved_context:
-            return "I couldn't find any relevant information in the uploaded documents."
-
-        prompt = f"""
+    prompt = f"""
 You are an intelligent document analysis assistant. Your goal is to answer the user's question accurately using ONLY the provided context.
 Pay close attention to specific details like account numbers, names, dates, and IDs.
 
@@ -174,9 +363,53 @@ Instructions:
 
 Answer:
 """
+    return prompt, None, (cache_key, namespaces, query_vector[0], context_ids)
+
+def query_chatbot(user_query, session_id=None):
+    try:
+        prompt, reply, cache_entry = build_prompt(user_query, session_id)
+        if prompt is None:
+            return reply
+
         response = ollama.generate(model=TEXT_MODEL_NAME, prompt=prompt)
+        cache_key, namespaces, query_vector, context_ids = cache_entry
+        answer_cache.put(cache_key, response['response'], namespaces, query_vector, context_ids)
         return response['response']
 
     except Exception as e:
         print(f"Error querying chatbot: {e}")
         return "Sorry, I encountered an error while processing your request."
+
+def stream_chatbot(user_query, session_id=None):
+    """Yield the answer piece by piece as the model generates it.
+
+    Closing this generator (e.g. when the client disconnects) closes the
+    underlying Ollama stream, which stops generation.
+    """
+    try:
+        prompt, reply, cache_entry = build_prompt(user_query, session_id)
+    except Exception as e:
+        print(f"Error querying chatbot: {e}")
+        yield "Sorry, I encountered an error while processing your request."
+        return
+    if prompt is None:
+        yield reply
+        return
+
+    stream = None
+    answer = ""
+    try:
+        stream = ollama.generate(model=TEXT_MODEL_NAME, prompt=prompt, stream=True)
+        for part in stream:
+            if part['response']:
+                answer += part['response']
+                yield part['response']
+        # Only reached when generation ran to completion
+        cache_key, namespaces, query_vector, context_ids = cache_entry
+        answer_cache.put(cache_key, answer, namespaces, query_vector, context_ids)
+    except Exception as e:
+        print(f"Error streaming chatbot response: {e}")
+        yield "Sorry, I encountered an error while processing your request."
+    finally:
+        if stream is not None and hasattr(stream, 'close'):
+            stream.close()
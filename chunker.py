@@ -0,0 +1,185 @@
+import os
+import re
+from collections import namedtuple
+
+# qwen:1.8b runs with a 2048-token context in Ollama and build_prompt sends
+# three chunks plus ~150 tokens of instructions, so chunks stay well under
+# a third of it. The old 500-word windows came to ~650 tokens each.
+CHUNK_TOKENS = int(os.environ.get('CHUNK_TOKENS', 480))
+CHUNK_OVERLAP_TOKENS = int(os.environ.get('CHUNK_OVERLAP_TOKENS', 48))
+# A heading only closes the chunk before it once that holds this many
+# tokens, so numbered list items and short sections (a certificate's
+# "1. Legal Name" rows) share a chunk instead of becoming one tiny chunk each
+MIN_SECTION_TOKENS = CHUNK_TOKENS // 5
+
+# Rough BPE count without loading the tokenizer: a letter run costs about a
+# token per four characters, and each digit or symbol costs one (Qwen's
+# tokenizer splits numbers into single digits).
+TOKEN_PATTERN = re.compile(r'[^\W\d_]+|\d|[^\w\s]|_')
+
+HEADING_MAX_CHARS = 80
+NUMBERED_HEADING_PATTERN = re.compile(
+    r'(?:\d{1,2}(?:\.\d{1,2})*[.)]?|[IVX]{1,5}[.)]|(?:Chapter|Section|Part|Annexure|Appendix)\b)\s+\S', re.IGNORECASE)
+SENTENCE_PATTERN = re.compile(r'\S.*?(?:[.!?](?=\s)|$)', re.DOTALL)
+WORD_PATTERN = re.compile(r'\S+')
+
+# One unit of packing: a heading, paragraph, sentence or run of words, with
+# its offsets into its page's text
+Piece = namedtuple('Piece', ['page', 'start', 'end', 'tokens', 'heading'])
+
+def estimate_tokens(text):
+    return sum(-(-len(token) // 4) if token[0].isalpha() else 1 for token in TOKEN_PATTERN.findall(text))
+
+def is_heading(line):
+    line = line.strip()
+    if not line or len(line) > HEADING_MAX_CHARS or line.endswith(('.', ',', ';')):
+        return False
+    if NUMBERED_HEADING_PATTERN.match(line) and not line[-1].isdigit():
+        return True
+    letters = [character for character in line if character.isalpha()]
+    return len(letters) >= 3 and all(character.isupper() for character in letters)
+
+def _split_block(page, text, start, end, max_tokens, reserved=0):
+    """Yield pieces of at most max_tokens for text[start:end], by sentence then by word.
+
+    The first piece is kept to max_tokens - reserved so the headings just
+    before the paragraph fit in the same chunk.
+    """
+    budget = max(max_tokens - reserved, 1)
+    tokens = estimate_tokens(text[start:end])
+    if tokens <= budget:
+        yield Piece(page, start, end, tokens, False)
+        return
+    for sentence in SENTENCE_PATTERN.finditer(text, start, end):
+        tokens = estimate_tokens(sentence.group())
+        if tokens <= budget:
+            yield Piece(page, sentence.start(), sentence.end(), tokens, False)
+            budget = max_tokens
+            continue
+        run_start = run_end = None
+        run_tokens = 0
+        for word in WORD_PATTERN.finditer(text, sentence.start(), sentence.end()):
+            word_tokens = estimate_tokens(word.group())
+            if run_start is not None and run_tokens + word_tokens > budget:
+                yield Piece(page, run_start, run_end, run_tokens, False)
+                budget = max_tokens
+                run_start, run_tokens = None, 0
+            if run_start is None:
+                run_start = word.start()
+            run_end = word.end()
+            run_tokens += word_tokens
+        if run_start is not None:
+            yield Piece(page, run_start, run_end, run_tokens, False)
+            budget = max_tokens
+
+def split_pages(pages, max_tokens):
+    """Yield the pieces of every page: each heading line, and each paragraph split to fit max_tokens."""
+    # Tokens of the heading lines still waiting for their first paragraph,
+    # which may be on the next page
+    pending = 0
+    for page, text in enumerate(pages, start=1):
+        block_start = None
+        offset = 0
+        for line in text.splitlines(keepends=True):
+            line_end = offset + len(line.rstrip('\r\n'))
+            if not line.strip() or is_heading(line):
+                if block_start is not None:
+                    yield from _split_block(page, text, block_start, block_end, max_tokens, pending)
+                    block_start, pending = None, 0
+                if line.strip():
+                    start = offset + len(line) - len(line.lstrip())
+                    piece = Piece(page, start, line_end, estimate_tokens(line), True)
+                    pending += piece.tokens
+                    yield piece
+            else:
+                if block_start is None:
+                    block_start = offset + len(line) - len(line.lstrip())
+                block_end = line_end
+            offset += len(line)
+        if block_start is not None:
+            yield from _split_block(page, text, block_start, block_end, max_tokens, pending)
+            pending = 0
+
+def _overlap(pieces, overlap_tokens):
+    """The trailing pieces of a chunk, up to overlap_tokens, to repeat at the start of the next one."""
+    tail = []
+    total = 0
+    for piece in reversed(pieces[1:]):
+        if piece.heading or total + piece.tokens > overlap_tokens:
+            break
+        tail.insert(0, piece)
+        total += piece.tokens
+    return tail
+
+def _make_chunk(pages, pieces, section):
+    first, last = pieces[0], pieces[-1]
+    if first.page == last.page:
+        text = pages[first.page - 1][first.start:last.end]
+    else:
+        text = "\n".join([pages[first.page - 1][first.start:]] +
+                         [pages[number - 1] for number in range(first.page + 1, last.page)] +
+                         [pages[last.page - 1][:last.end]])
+    return {
+        "content": re.sub(r'[ \t]+', ' ', text).strip(),
+        "section": section,
+        "page": first.page,
+        "page_end": last.page,
+        "start": first.start,
+        "end": last.end,
+        "tokens": sum(piece.tokens for piece in pieces),
+    }
+
+def chunk_pages(pages, max_tokens=None, overlap_tokens=None):
+    """Split a document's page texts into chunks of at most max_tokens estimated tokens.
+
+    A heading starts a new chunk once the current one holds
+    MIN_SECTION_TOKENS, and a page break ends a chunk once it holds a third
+    of max_tokens. Only chunks cut for size repeat the last overlap_tokens
+    of the previous one. Each chunk is a dict with its content, section
+    heading, first and last page (1-based) and the offsets of its start in
+    the first page's text and its end in the last.
+    """
+    max_tokens = max_tokens or CHUNK_TOKENS
+    overlap_tokens = CHUNK_OVERLAP_TOKENS if overlap_tokens is None else overlap_tokens
+    min_page_tokens = max_tokens // 3
+
+    chunks = []
+    current, current_tokens, section = [], 0, None
+    chunk_section = None
+    for piece in split_pages(pages, max_tokens):
+        starts_section = piece.heading and current_tokens >= MIN_SECTION_TOKENS
+        page_break = current and piece.page != current[-1].page and current_tokens >= min_page_tokens
+        too_big = current_tokens + piece.tokens > max_tokens
+        # Headings alone never make a chunk; split_pages leaves room for them in the next piece
+        if current and not all(item.heading for item in current) and (starts_section or page_break or too_big):
+            # Headings at the end of a full chunk belong with the text after them
+            split = len(current)
+            while split > 1 and current[split - 1].heading:
+                split -= 1
+            chunks.append(_make_chunk(pages, current[:split], chunk_section))
+            if split < len(current):
+                current = current[split:]
+                chunk_section = section
+            elif starts_section or page_break:
+                current = []
+            else:
+                current = _overlap(current, overlap_tokens)
+            if sum(item.tokens for item in current) + piece.tokens > max_tokens:
+                current = []
+            current_tokens = sum(item.tokens for item in current)
+        if piece.heading:
+            section = re.sub(r'\s+', ' ', pages[piece.page - 1][piece.start:piece.end]).strip()
+        if not current:
+            chunk_section = section
+        current.append(piece)
+        current_tokens += piece.tokens
+    if current:
+        chunks.append(_make_chunk(pages, current, chunk_section))
+    return chunks
+
+def embedding_text(chunk):
+    """The text to embed for a chunk: its content, led by its section heading when it doesn't start with it."""
+    section = chunk.get("section")
+    if section and not chunk["content"].startswith(section):
+        return f"{section}\n{chunk['content']}"
+    return chunk["content"]
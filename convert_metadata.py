@@ -0,0 +1,57 @@
+"""
+Convert the pickled metadata stores to SQLite.
+
+USAGE:
+    python convert_metadata.py
+
+Moves each store that still exists in the old format:
+    chatbot_index.faiss + chatbot_metadata.pkl -> chatbot_kb/ (rows in rows.db)
+    chatbot_kb/seg-*.pkl                       -> chatbot_kb/rows.db
+    authentic_docs_metadata.pkl                -> authentic_docs/metadata.db
+    gst_metadata.pkl                           -> gst_metadata.db
+
+The app, the authenticity detector and ocrmodel/GSTocr.py all convert on
+first load; this script lets you do it ahead of a deploy. The .pkl files
+are left in place and are no longer read once their database exists.
+"""
+
+import os
+import chatbot_logic
+import kb_store
+import gst_registry
+import metadata_store
+import train_authenticity_model
+
+def convert_chatbot():
+    # Opening the store moves any per-segment .pkl rows into rows.db
+    store = kb_store.SegmentStore(chatbot_logic.STORE_DIR)
+    if store.is_empty() and not os.path.exists(store.manifest_path) \
+            and os.path.exists(chatbot_logic.INDEX_FILE) and os.path.exists(chatbot_logic.METADATA_FILE):
+        chatbot_logic.import_legacy_knowledge_base(chatbot_logic.KnowledgeBase("base", chatbot_logic.STORE_DIR))
+        store = kb_store.SegmentStore(chatbot_logic.STORE_DIR)
+    print(f"Chatbot: {len(store.metadata)} rows in '{store.metadata.path}'.")
+
+def convert_authenticity():
+    detector = train_authenticity_model.DocumentAuthenticityDetector()
+    for doc_type, partition in detector.partitions.items():
+        print(f"Authenticity {doc_type}: {len(partition.metadata_store)} rows "
+              f"in '{train_authenticity_model.AUTHENTIC_DOCS_METADATA_DB}'.")
+
+def convert_gst():
+    if os.path.exists(gst_registry.GST_METADATA_FILE):
+        print(f"GST: '{gst_registry.GST_METADATA_FILE}' already exists.")
+        return
+    if not os.path.exists(gst_registry.LEGACY_GST_METADATA_FILE):
+        print(f"GST: no '{gst_registry.LEGACY_GST_METADATA_FILE}' to convert.")
+        return
+    count = metadata_store.convert_pickle(gst_registry.LEGACY_GST_METADATA_FILE, gst_registry.GST_METADATA_FILE)
+    print(f"GST: {count} rows in '{gst_registry.GST_METADATA_FILE}'.")
+
+def main():
+    convert_chatbot()
+    convert_authenticity()
+    convert_gst()
+    return True
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,140 @@
+import re
+
+# Fields of a GST Registration Certificate (Form GST REG-06), in the order
+# the LLM prompt lists them.
+FIELDS = {
+    'legal_name': 'legal_name',
+    'registration_number': 'registration_number (the GSTIN)',
+    'trade_name': "trade_name (if any, otherwise 'N/A')",
+    'address': 'address (the full principal place of business address)',
+    'date_of_liability': 'date_of_liability',
+    'type_of_registration': 'type_of_registration (Regular, Composition, etc.)',
+    'date_of_issue': 'date_of_issue',
+}
+
+GSTIN_CHARACTERS = '0123456789ABCDEFGHIJKLMNOPQRSTUVWXYZ'
+# 2-digit state code, the holder's PAN, entity number, 'Z', check character
+GSTIN_PATTERN = re.compile(r'\b(\d{2}[A-Z]{5}\d{4}[A-Z][1-9A-Z]Z[0-9A-Z])\b')
+# Same shape but tolerant of OCR swapping letters and digits, for repair
+GSTIN_CANDIDATE_PATTERN = re.compile(r'\b([0-9OIlSB]{2}[A-Z0-9]{5}[0-9OIlSB]{4}[A-Z0-9][0-9A-Zil][Z2][0-9A-Z])\b')
+DIGIT_POSITIONS = (0, 1, 7, 8, 9, 10)
+LETTER_POSITIONS = (2, 3, 4, 5, 6, 11)
+TO_DIGIT = str.maketrans({'O': '0', 'I': '1', 'l': '1', 'S': '5', 'B': '8'})
+TO_LETTER = str.maketrans({'0': 'O', '1': 'I', '5': 'S', '8': 'B'})
+# The entity code (position 12) may be a digit or a letter, so a 1/I/l there is ambiguous
+ENTITY_POSITION = 12
+ENTITY_ALTERNATIVES = {'1': '1I', 'I': 'I1', 'i': '1I', 'l': '1I'}
+
+DATE = r'(\d{1,2})[/.\-](\d{1,2})[/.\-](\d{4})'
+# A label, optional ':' or '-', then the value on the same or the next line
+VALUE = r'[ \t]*[:\-]?[ \t]*\n?[ \t]*'
+
+LABEL_PATTERNS = {
+    'registration_number': re.compile(r'Registration\s+Number' + VALUE + r'([0-9A-Z]{15})\b', re.IGNORECASE),
+    'legal_name': re.compile(r'Legal\s+Name(?:\s+of\s+Business)?' + VALUE + r'([^\n]+)', re.IGNORECASE),
+    'trade_name': re.compile(r'Trade\s+Name,?(?:\s*if\s+any)?' + VALUE + r'([^\n]+)', re.IGNORECASE),
+    'date_of_liability': re.compile(r'Date\s+of\s+Liability' + VALUE + DATE, re.IGNORECASE),
+    'date_of_issue': re.compile(r'Date\s+of\s+issue(?:\s+of\s+Certificate)?' + VALUE + DATE, re.IGNORECASE),
+}
+
+# The address runs over several lines until the next numbered field or label
+ADDRESS_PATTERN = re.compile(
+    r'Address\s+of\s+Principal\s+Place\s+of\s+Business' + VALUE +
+    r'(.+?)(?=\n\s*\d{1,2}\s*[.)]\s|\n\s*Date\s+of\s+Liability|\Z)',
+    re.IGNORECASE | re.DOTALL)
+
+REGISTRATION_TYPES = ['Regular', 'Composition', 'Casual Taxable Person', 'Input Service Distributor',
+                      'Non Resident Taxable Person', 'Non-Resident Taxable Person', 'Tax Deductor',
+                      'Tax Collector', 'OIDAR', 'UN Bodies', 'Embassy']
+REGISTRATION_TYPE_PATTERN = re.compile(
+    r'Type\s+of\s+Registration' + VALUE + '(' + '|'.join(re.escape(name) for name in REGISTRATION_TYPES) + r')\b',
+    re.IGNORECASE)
+
+def gstin_check_character(first_fourteen):
+    total = 0
+    for position, character in enumerate(first_fourteen):
+        product = GSTIN_CHARACTERS.index(character) * (2 if position % 2 else 1)
+        total += product // 36 + product % 36
+    return GSTIN_CHARACTERS[(36 - total % 36) % 36]
+
+def is_valid_gstin(gstin):
+    gstin = (gstin or '').strip().upper()
+    return bool(GSTIN_PATTERN.fullmatch(gstin)) and gstin_check_character(gstin[:14]) == gstin[14]
+
+def repair_gstin(candidate):
+    """Undo the usual OCR letter/digit swaps by position; return the GSTIN if it then checks out."""
+    characters = list(candidate)
+    for position in DIGIT_POSITIONS:
+        characters[position] = characters[position].translate(TO_DIGIT)
+    for position in LETTER_POSITIONS:
+        characters[position] = characters[position].upper().translate(TO_LETTER)
+    characters[13] = 'Z'
+    # Try each reading of an ambiguous entity code and let the checksum choose
+    for entity in ENTITY_ALTERNATIVES.get(characters[ENTITY_POSITION], characters[ENTITY_POSITION]):
+        characters[ENTITY_POSITION] = entity
+        gstin = ''.join(characters).upper()
+        if is_valid_gstin(gstin):
+            return gstin
+    return None
+
+def find_gstin(text):
+    """Return the certificate's GSTIN: the labelled one if valid, else the first valid one anywhere."""
+    match = LABEL_PATTERNS['registration_number'].search(text)
+    candidates = [match.group(1)] if match else []
+    candidates += GSTIN_PATTERN.findall(text) + GSTIN_CANDIDATE_PATTERN.findall(text)
+    for candidate in candidates:
+        gstin = candidate.upper() if is_valid_gstin(candidate) else repair_gstin(candidate)
+        if gstin:
+            return gstin
+    return None
+
+NEXT_FIELD_PATTERN = re.compile(r'\d{1,2}\s*[.)]\s')
+
+def clean_value(value):
+    value = re.sub(r'\s+', ' ', value).strip(' :-,.')
+    # An empty field followed by the next numbered field's label
+    if not value or NEXT_FIELD_PATTERN.match(value):
+        return None
+    return value
+
+def normalize_date(day, month, year):
+    return f"{int(day):02d}/{int(month):02d}/{year}"
+
+def extract_fields(text):
+    """Fill what the fixed REG-06 layout gives away.
+
+    Returns (fields, sources): fields maps each name in FIELDS to a value or
+    None, sources maps each filled field to 'rules'.
+    """
+    fields = dict.fromkeys(FIELDS)
+
+    fields['registration_number'] = find_gstin(text)
+
+    match = LABEL_PATTERNS['legal_name'].search(text)
+    if match:
+        fields['legal_name'] = clean_value(match.group(1))
+
+    match = LABEL_PATTERNS['trade_name'].search(text)
+    if match:
+        # The row is printed even when there is no trade name; 'N/A' is what the LLM prompt asks for then
+        fields['trade_name'] = clean_value(match.group(1)) or 'N/A'
+
+    for name in ('date_of_liability', 'date_of_issue'):
+        match = LABEL_PATTERNS[name].search(text)
+        if match:
+            fields[name] = normalize_date(*match.groups())
+
+    match = ADDRESS_PATTERN.search(text)
+    if match:
+        fields['address'] = clean_value(match.group(1))
+
+    match = REGISTRATION_TYPE_PATTERN.search(text)
+    if match:
+        canonical = {name.lower(): name for name in REGISTRATION_TYPES}
+        fields['type_of_registration'] = canonical[match.group(1).lower()]
+
+    sources = {name: 'rules' for name, value in fields.items() if value}
+    return fields, sources
+
+def missing_fields(fields):
+    return [name for name in FIELDS if not fields.get(name)]
@@ -0,0 +1,150 @@
+import os
+import re
+import threading
+import gst_extractor
+import metadata_store
+
+REGISTRY_DB = os.environ.get('GST_REGISTRY_DB', 'gst_registry.db')
+GST_METADATA_FILE = "gst_metadata.db"
+LEGACY_GST_METADATA_FILE = "gst_metadata.pkl"
+# 2: re-import with repair_gstin reading an OCR'd I in the entity code as 1
+BACKFILL_VERSION = 2
+SEARCH_LIMIT = 20
+
+COLUMNS = ['gstin', 'pan', 'state_code', 'legal_name', 'trade_name', 'address', 'type_of_registration',
+           'date_of_liability', 'date_of_issue', 'source_file', 'content_hash', 'vector_id']
+
+# Exact lookups go through the GSTIN primary key and the PAN index; names
+# and addresses are searched through an FTS5 table kept in sync by triggers.
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS registrations (
+    gstin TEXT PRIMARY KEY,
+    pan TEXT NOT NULL,
+    state_code TEXT NOT NULL,
+    legal_name TEXT,
+    trade_name TEXT,
+    address TEXT,
+    type_of_registration TEXT,
+    date_of_liability TEXT,
+    date_of_issue TEXT,
+    source_file TEXT,
+    content_hash TEXT,
+    vector_id INTEGER
+);
+CREATE INDEX IF NOT EXISTS registrations_by_pan ON registrations (pan);
+CREATE VIRTUAL TABLE IF NOT EXISTS registrations_fts USING fts5(
+    legal_name, trade_name, address, content='registrations', content_rowid='rowid'
+);
+CREATE TRIGGER IF NOT EXISTS registrations_ai AFTER INSERT ON registrations BEGIN
+    INSERT INTO registrations_fts (rowid, legal_name, trade_name, address)
+    VALUES (new.rowid, new.legal_name, new.trade_name, new.address);
+END;
+CREATE TRIGGER IF NOT EXISTS registrations_ad AFTER DELETE ON registrations BEGIN
+    INSERT INTO registrations_fts (registrations_fts, rowid, legal_name, trade_name, address)
+    VALUES ('delete', old.rowid, old.legal_name, old.trade_name, old.address);
+END;
+CREATE TRIGGER IF NOT EXISTS registrations_au AFTER UPDATE ON registrations BEGIN
+    INSERT INTO registrations_fts (registrations_fts, rowid, legal_name, trade_name, address)
+    VALUES ('delete', old.rowid, old.legal_name, old.trade_name, old.address);
+    INSERT INTO registrations_fts (rowid, legal_name, trade_name, address)
+    VALUES (new.rowid, new.legal_name, new.trade_name, new.address);
+END;
+"""
+
+_init_lock = threading.Lock()
+_initialized = False
+
+def get_connection():
+    global _initialized
+    conn = metadata_store.connect(REGISTRY_DB)
+    if not _initialized:
+        with _init_lock:
+            if not _initialized:
+                conn.executescript(SCHEMA)
+                conn.commit()
+                _initialized = True
+    return conn
+
+def normalize_gstin(value):
+    """Return the checksum-valid GSTIN for value (repairing OCR swaps), or None."""
+    value = re.sub(r'\s+', '', str(value or ''))
+    if gst_extractor.is_valid_gstin(value):
+        return value.upper()
+    if len(value) == 15:
+        return gst_extractor.repair_gstin(value)
+    return None
+
+def _row_for(metadata, vector_id=None):
+    gstin = normalize_gstin(metadata.get('registration_number'))
+    if not gstin:
+        return None
+    row = {name: metadata.get(name) for name in COLUMNS}
+    row.update(gstin=gstin, pan=gstin[2:12], state_code=gstin[:2], vector_id=vector_id)
+    return [row[name] if row[name] is None or isinstance(row[name], (int, str)) else str(row[name])
+            for name in COLUMNS]
+
+def upsert_many(entries):
+    """Add or refresh (metadata, vector_id) pairs; entries without a valid GSTIN are skipped.
+
+    Returns how many were stored.
+    """
+    rows = [row for row in (_row_for(metadata, vector_id) for metadata, vector_id in entries) if row]
+    conn = get_connection()
+    placeholders = ", ".join("?" for _ in COLUMNS)
+    updates = ", ".join(f"{name} = excluded.{name}" for name in COLUMNS[1:])
+    with conn:
+        conn.executemany(
+            f"INSERT INTO registrations ({', '.join(COLUMNS)}) VALUES ({placeholders}) "
+            f"ON CONFLICT(gstin) DO UPDATE SET {updates}", rows)
+    return len(rows)
+
+def upsert(metadata, vector_id=None):
+    return upsert_many([(metadata, vector_id)]) == 1
+
+def lookup(gstin):
+    gstin = re.sub(r'\s+', '', str(gstin or '')).upper()
+    row = get_connection().execute("SELECT * FROM registrations WHERE gstin = ?", (gstin,)).fetchone()
+    return dict(row) if row else None
+
+def find_by_pan(pan):
+    """Every registration of one business: the PAN is characters 3-12 of each of its GSTINs."""
+    rows = get_connection().execute("SELECT * FROM registrations WHERE pan = ? ORDER BY gstin",
+                                    (str(pan or '').strip().upper(),)).fetchall()
+    return [dict(row) for row in rows]
+
+def search(query, limit=SEARCH_LIMIT):
+    """Full-text search over legal name, trade name and address, best matches first."""
+    # Each word becomes a quoted prefix term so user input can't inject FTS syntax
+    terms = [f'"{word}"*' for word in re.findall(r'\w+', query or '')]
+    if not terms:
+        return []
+    rows = get_connection().execute(
+        "SELECT registrations.* FROM registrations_fts "
+        "JOIN registrations ON registrations.rowid = registrations_fts.rowid "
+        "WHERE registrations_fts MATCH ? ORDER BY bm25(registrations_fts) LIMIT ?",
+        (" ".join(terms), limit)).fetchall()
+    return [dict(row) for row in rows]
+
+def import_metadata(metadata):
+    """Load GSTocr metadata ({vector id: metadata}, a dict or a MetadataStore) into the registry."""
+    return upsert_many((row, vector_id) for vector_id, row in metadata.items())
+
+def backfill(metadata_file=GST_METADATA_FILE):
+    """Import the GST metadata once per database; user_version records that it has been."""
+    conn = get_connection()
+    if conn.execute("PRAGMA user_version").fetchone()[0] >= BACKFILL_VERSION:
+        return 0
+
+    imported = 0
+    # Until GSTocr.py next runs and converts it, the metadata may still be the old pickle
+    for path in (metadata_file, LEGACY_GST_METADATA_FILE):
+        if os.path.exists(path):
+            metadata = metadata_store.open_metadata(path)
+            # Stored GSTINs go through normalize_gstin, so OCR swaps are repaired before a row is skipped
+            imported = import_metadata(metadata)
+            print(f"GST registry: imported {imported} of {len(metadata)} entries from '{path}' "
+                  f"({len(metadata) - imported} skipped without a valid GSTIN).")
+            break
+    with conn:
+        conn.execute(f"PRAGMA user_version = {BACKFILL_VERSION}")
+    return imported
@@ -0,0 +1,130 @@
+import os
+import time
+import uuid
+import threading
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+
+JOB_WORKERS = int(os.environ.get('JOB_WORKERS', 2))
+# Housekeeping (thumbnails) runs on its own pool so it never queues ahead of user-facing jobs
+BACKGROUND_WORKERS = int(os.environ.get('JOB_BACKGROUND_WORKERS', 1))
+JOB_RETENTION_SECONDS = int(os.environ.get('JOB_RETENTION_SECONDS', 3600))
+
+_executor = None
+_background_executor = None
+_jobs = {}
+_lock = threading.Lock()
+
+class Job:
+    def __init__(self, kind, stages):
+        self.id = uuid.uuid4().hex
+        self.kind = kind
+        self.status = "queued"
+        self.stages = OrderedDict(
+            (name, {"status": "pending", "pages_done": 0, "pages_total": None})
+            for name in stages
+        )
+        self.current_stage = None
+        self.result = None
+        self.error = None
+        self.created_at = time.time()
+        self.updated_at = self.created_at
+        self._lock = threading.Lock()
+
+    def start_stage(self, name):
+        with self._lock:
+            self.current_stage = name
+            self.stages.setdefault(name, {"status": "pending", "pages_done": 0, "pages_total": None})
+            self.stages[name]["status"] = "running"
+            self.updated_at = time.time()
+
+    def update_pages(self, pages_done, pages_total, name=None):
+        with self._lock:
+            stage = self.stages[name or self.current_stage]
+            stage["pages_done"] = pages_done
+            stage["pages_total"] = pages_total
+            self.updated_at = time.time()
+
+    def finish_stage(self, name=None, status="done"):
+        with self._lock:
+            self.stages[name or self.current_stage]["status"] = status
+            self.updated_at = time.time()
+
+    def is_finished(self):
+        return self.status in ("done", "failed")
+
+    def to_dict(self):
+        with self._lock:
+            data = {
+                "job_id": self.id,
+                "kind": self.kind,
+                "status": self.status,
+                "current_stage": self.current_stage,
+                "stages": {name: dict(stage) for name, stage in self.stages.items()},
+                "created_at": self.created_at,
+                "updated_at": self.updated_at,
+            }
+        if self.status == "done":
+            data["result"] = self.result
+        elif self.status == "failed":
+            data["error"] = self.error
+        return data
+
+def get_executor():
+    global _executor
+    if _executor is None:
+        _executor = ThreadPoolExecutor(max_workers=JOB_WORKERS, thread_name_prefix="job")
+    return _executor
+
+def get_background_executor():
+    global _background_executor
+    if _background_executor is None:
+        _background_executor = ThreadPoolExecutor(max_workers=BACKGROUND_WORKERS, thread_name_prefix="background-job")
+    return _background_executor
+
+def _run(job, func, args, kwargs):
+    job.status = "running"
+    try:
+        job.result = func(job, *args, **kwargs)
+        # Pipelines report handled failures as {"error": ...} rather than raising
+        if isinstance(job.result, dict) and "error" in job.result:
+            job.error = job.result["error"]
+            job.status = "failed"
+        else:
+            job.status = "done"
+    except Exception as e:
+        print(f"Job {job.id} ({job.kind}) failed: {e}")
+        job.error = str(e)
+        job.status = "failed"
+        if job.current_stage:
+            job.finish_stage(status="failed")
+    job.updated_at = time.time()
+
+def _prune_finished_jobs():
+    cutoff = time.time() - JOB_RETENTION_SECONDS
+    with _lock:
+        expired = [job_id for job_id, job in _jobs.items()
+                   if job.is_finished() and job.updated_at < cutoff]
+        for job_id in expired:
+            del _jobs[job_id]
+
+def _submit(executor, kind, stages, func, args, kwargs):
+    _prune_finished_jobs()
+
+    job = Job(kind, stages)
+    with _lock:
+        _jobs[job.id] = job
+    executor.submit(_run, job, func, args, kwargs)
+    return job
+
+def submit(kind, stages, func, *args, **kwargs):
+    """Queue func(job, *args, **kwargs) on the worker pool and return the Job at once."""
+    return _submit(get_executor(), kind, stages, func, args, kwargs)
+
+def submit_background(kind, stages, func, *args, **kwargs):
+    """Like submit, but on the small background pool for work nobody is waiting on."""
+    return _submit(get_background_executor(), kind, stages, func, args, kwargs)
+
+def get_job(job_id):
+    with _lock:
+        return _jobs.get(job_id)
@@ -0,0 +1,205 @@
+import os
+import json
+import pickle
+import threading
+import numpy as np
+import faiss
+import metadata_store
+import vector_index
+
+SNAPSHOT_FILE = "index.faiss"
+ROWS_FILE = "rows.db"
+COMPACT_SEGMENT_THRESHOLD = int(os.environ.get('KB_COMPACT_SEGMENTS', 8))
+
+class SegmentStore:
+    """Append-only vector + metadata store.
+
+    Every append writes one small vector segment (seg-NNNNNN.npy), its
+    metadata rows into rows.db keyed by vector id, and a tiny manifest
+    listing the live segments in order, so an upload costs I/O proportional
+    to its own size. Vector ids are positions in manifest order, which
+    compaction preserves by merging a prefix of the segment list into one
+    segment; rows are looked up one id at a time and never loaded whole.
+    """
+
+    def __init__(self, directory):
+        self.directory = directory
+        self.manifest_path = os.path.join(directory, "manifest.json")
+        self._lock = threading.Lock()
+        self._compaction_thread = None
+        self.segments = []
+        self.next_segment = 0
+        self.snapshot = None
+        # Which embedding endpoint/model made the vectors; None for stores from before it was recorded
+        self.embedding = None
+        self.row_count = 0
+        self.metadata = metadata_store.MetadataStore(os.path.join(directory, ROWS_FILE), "rows")
+        self._read_manifest()
+        self._import_pickled_rows()
+
+    def _read_manifest(self):
+        if os.path.exists(self.manifest_path):
+            with open(self.manifest_path, "r") as f:
+                manifest = json.load(f)
+            self.segments = manifest["segments"]
+            self.next_segment = manifest["next_segment"]
+            self.snapshot = manifest.get("snapshot")
+            self.embedding = manifest.get("embedding")
+            # .npy headers give the row counts without reading any vectors
+            self.row_count = sum(len(self.read_segment(name)) for name in self.segments)
+
+    def _import_pickled_rows(self):
+        """Move rows from older stores' per-segment .pkl files into rows.db."""
+        first_id = 0
+        for name in self.segments:
+            _, rows_path = self._segment_paths(name)
+            count = len(self.read_segment(name))
+            if os.path.exists(rows_path):
+                with open(rows_path, "rb") as f:
+                    rows = pickle.load(f)
+                self.metadata.put_many(enumerate(rows, start=first_id))
+                os.remove(rows_path)
+            first_id += count
+
+    def _write_manifest(self):
+        os.makedirs(self.directory, exist_ok=True)
+        tmp_path = self.manifest_path + ".tmp"
+        with open(tmp_path, "w") as f:
+            json.dump({"segments": self.segments, "next_segment": self.next_segment,
+                       "snapshot": self.snapshot, "embedding": self.embedding}, f)
+        os.replace(tmp_path, self.manifest_path)
+
+    def _segment_paths(self, name):
+        base = os.path.join(self.directory, name)
+        return base + ".npy", base + ".pkl"
+
+    def _new_segment_name(self):
+        name = f"seg-{self.next_segment:06d}"
+        self.next_segment += 1
+        return name
+
+    def _write_segment(self, name, vectors):
+        os.makedirs(self.directory, exist_ok=True)
+        vector_path, _ = self._segment_paths(name)
+        with open(vector_path + ".tmp", "wb") as f:
+            np.save(f, np.ascontiguousarray(vectors, dtype='float32'))
+        os.replace(vector_path + ".tmp", vector_path)
+
+    def _delete_segments(self, names):
+        for name in names:
+            for path in self._segment_paths(name):
+                try:
+                    os.remove(path)
+                except OSError:
+                    pass
+
+    def is_empty(self):
+        return not self.segments
+
+    def read_segment(self, name):
+        vector_path, _ = self._segment_paths(name)
+        return np.load(vector_path, mmap_mode='r')
+
+    def load(self):
+        """Yield (name, vectors) per live segment; vectors are memory-mapped."""
+        with self._lock:
+            segments = list(self.segments)
+        for name in segments:
+            yield name, self.read_segment(name)
+
+    def write_index_snapshot(self, index, index_type):
+        """Save a built FAISS index covering the current segments so boot can skip rebuilding it."""
+        with self._lock:
+            os.makedirs(self.directory, exist_ok=True)
+            snapshot_path = os.path.join(self.directory, SNAPSHOT_FILE)
+            faiss.write_index(index, snapshot_path + ".tmp")
+            os.replace(snapshot_path + ".tmp", snapshot_path)
+            self.snapshot = {"segments": list(self.segments), "index_type": index_type,
+                             "ntotal": int(index.ntotal)}
+            self._write_manifest()
+
+    def read_index_snapshot(self, index_type):
+        """Return (index, segment names it covers), or (None, []); flat and HNSW snapshots are memory-mapped."""
+        with self._lock:
+            snapshot = self.snapshot
+            segments = list(self.segments)
+        snapshot_path = os.path.join(self.directory, SNAPSHOT_FILE)
+        if not snapshot or snapshot["index_type"] != index_type or not os.path.exists(snapshot_path):
+            return None, []
+        covered = snapshot["segments"]
+        # Appends after the snapshot are fine; compaction or a clear makes it stale
+        if segments[:len(covered)] != covered:
+            return None, []
+        flags = faiss.IO_FLAG_MMAP if index_type in vector_index.MMAP_INDEX_TYPES else 0
+        return faiss.read_index(snapshot_path, flags), covered
+
+    def append(self, vectors, rows, embedding=None):
+        with self._lock:
+            if embedding:
+                self.embedding = embedding
+            # Rows go in first: ids past the manifest's vectors are simply never asked for
+            self.metadata.delete_from(self.row_count)
+            self.metadata.put_many(enumerate(rows, start=self.row_count))
+            name = self._new_segment_name()
+            self._write_segment(name, vectors)
+            self.segments.append(name)
+            self._write_manifest()
+            self.row_count += len(vectors)
+
+    def replace_vectors(self, vectors, embedding):
+        """Swap every vector for re-embedded ones in one segment; rows and vector ids stay as they are."""
+        with self._lock:
+            dropped = self.segments
+            name = self._new_segment_name()
+            self._write_segment(name, vectors)
+            self.segments = [name]
+            self.snapshot = None
+            self.embedding = embedding
+            self.row_count = len(vectors)
+            self._write_manifest()
+        self._delete_segments(dropped)
+
+    def clear(self):
+        with self._lock:
+            dropped = self.segments
+            self.segments = []
+            self.snapshot = None
+            self.row_count = 0
+            self._write_manifest()
+            self.metadata.clear()
+        self._delete_segments(dropped)
+
+    def compact(self):
+        with self._lock:
+            merged = list(self.segments)
+            if len(merged) < 2:
+                return False
+            name = self._new_segment_name()
+            self._write_manifest()
+
+        vector_parts = [self.read_segment(segment) for segment in merged]
+        self._write_segment(name, np.concatenate(vector_parts))
+
+        with self._lock:
+            if self.segments[:len(merged)] != merged:
+                # Cleared or rewritten while we merged; the merge is stale
+                self._delete_segments([name])
+                return False
+            self.segments = [name] + self.segments[len(merged):]
+            self._write_manifest()
+        self._delete_segments(merged)
+        return True
+
+    def maybe_compact_in_background(self):
+        if len(self.segments) < COMPACT_SEGMENT_THRESHOLD:
+            return
+        if self._compaction_thread and self._compaction_thread.is_alive():
+            return
+        self._compaction_thread = threading.Thread(target=self._compact_quietly, daemon=True)
+        self._compaction_thread.start()
+
+    def _compact_quietly(self):
+        try:
+            self.compact()
+        except Exception as e:
+            print(f"Knowledge base compaction failed: {e}")
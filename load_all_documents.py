@@ -56,6 +56,11 @@ def load_all_documents():
         print(f"Failed to load: {', '.join(failed_loads)}")
     
     if successful_loads > 0:
+        print("\nBuilding prebuilt knowledge base artifact...")
+        vector_count = chatbot_logic.build_knowledge_base_artifact()
+        print(f"  Wrote {vector_count} vectors to '{chatbot_logic.STORE_DIR}'.")
+        print("  Copy this folder next to app.py on other servers to skip loading at startup.")
+        
         print("\nThe chatbot is now ready to answer questions!")
         print("\nYou can ask about:")
         print("   Bronze certification requirements and procedures")
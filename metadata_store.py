@@ -0,0 +1,170 @@
+import os
+import re
+import json
+import pickle
+import sqlite3
+import threading
+
+# Vector metadata kept in SQLite, one JSON row per vector id, so a single
+# row is read by primary key instead of unpickling the whole store and an
+# append writes only the new rows.
+TABLE_NAME_PATTERN = re.compile(r'[A-Za-z_][A-Za-z0-9_]*')
+PROPERTIES_TABLE = "_properties"
+BATCH_SIZE = 500
+
+_local = threading.local()
+_init_lock = threading.Lock()
+_initialized = set()
+
+def connect(path):
+    """This thread's connection to the SQLite file at path, opened in WAL mode on first use."""
+    # sqlite3 connections are per thread; requests and job workers each get their own
+    connections = getattr(_local, 'connections', None)
+    if connections is None:
+        connections = _local.connections = {}
+    conn = connections.get(path)
+    if conn is None:
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        conn = sqlite3.connect(path, timeout=30)
+        conn.row_factory = sqlite3.Row
+        conn.execute("PRAGMA journal_mode=WAL")
+        connections[path] = conn
+    return conn
+
+def get_connection(path, table):
+    conn = connect(path)
+    key = (os.path.abspath(path), table)
+    if key not in _initialized:
+        with _init_lock:
+            if key not in _initialized:
+                conn.execute(f"CREATE TABLE IF NOT EXISTS {table} "
+                             "(vector_id INTEGER PRIMARY KEY, data TEXT NOT NULL)")
+                conn.commit()
+                _initialized.add(key)
+    return conn
+
+def _check_table(table):
+    if not TABLE_NAME_PATTERN.fullmatch(table) or table == PROPERTIES_TABLE:
+        raise ValueError(f"Invalid metadata table name: {table!r}")
+    return table
+
+def _encode(row):
+    # default=str keeps datetimes and numpy scalars readable instead of failing the write
+    return json.dumps(row, default=str)
+
+class MetadataStore:
+    """{vector id: row} mapping backed by one table of a SQLite file.
+
+    Supports the dict operations the index code uses (get, [], in, len,
+    items, values) with every lookup going to the database, so opening a
+    store costs nothing however many rows it holds.
+    """
+
+    def __init__(self, path, table="metadata"):
+        self.path = path
+        self.table = _check_table(table)
+
+    @property
+    def _conn(self):
+        return get_connection(self.path, self.table)
+
+    def get(self, vector_id, default=None):
+        row = self._conn.execute(f"SELECT data FROM {self.table} WHERE vector_id = ?",
+                                 (int(vector_id),)).fetchone()
+        return json.loads(row[0]) if row else default
+
+    def __getitem__(self, vector_id):
+        row = self.get(vector_id)
+        if row is None:
+            raise KeyError(vector_id)
+        return row
+
+    def __contains__(self, vector_id):
+        return self._conn.execute(f"SELECT 1 FROM {self.table} WHERE vector_id = ?",
+                                  (int(vector_id),)).fetchone() is not None
+
+    def __len__(self):
+        return self._conn.execute(f"SELECT COUNT(*) FROM {self.table}").fetchone()[0]
+
+    def items(self):
+        """Yield (vector id, row) in id order, a batch of rows at a time."""
+        last_id = -1
+        while True:
+            batch = self._conn.execute(
+                f"SELECT vector_id, data FROM {self.table} WHERE vector_id > ? ORDER BY vector_id LIMIT ?",
+                (last_id, BATCH_SIZE)).fetchall()
+            for vector_id, data in batch:
+                yield vector_id, json.loads(data)
+            if len(batch) < BATCH_SIZE:
+                return
+            last_id = batch[-1][0]
+
+    def keys(self):
+        for vector_id, _ in self.items():
+            yield vector_id
+
+    __iter__ = keys
+
+    def values(self):
+        for _, row in self.items():
+            yield row
+
+    def put_many(self, entries):
+        """Write (vector id, row) pairs in one transaction, replacing existing ids."""
+        conn = self._conn
+        with conn:
+            conn.executemany(f"INSERT OR REPLACE INTO {self.table} (vector_id, data) VALUES (?, ?)",
+                             ((int(vector_id), _encode(row)) for vector_id, row in entries))
+
+    def __setitem__(self, vector_id, row):
+        self.put_many([(vector_id, row)])
+
+    def delete_from(self, first_id):
+        """Drop every row with an id >= first_id."""
+        conn = self._conn
+        with conn:
+            conn.execute(f"DELETE FROM {self.table} WHERE vector_id >= ?", (int(first_id),))
+
+    def clear(self):
+        self.delete_from(0)
+
+def list_tables(path):
+    if not os.path.exists(path):
+        return []
+    rows = connect(path).execute(
+        "SELECT name FROM sqlite_master WHERE type = 'table' AND name != ? ORDER BY name",
+        (PROPERTIES_TABLE,)).fetchall()
+    return [name for (name,) in rows if TABLE_NAME_PATTERN.fullmatch(name)]
+
+def _properties(path):
+    conn = connect(path)
+    conn.execute(f"CREATE TABLE IF NOT EXISTS {PROPERTIES_TABLE} (key TEXT PRIMARY KEY, value TEXT NOT NULL)")
+    return conn
+
+def get_property(path, key, default=None):
+    """File-level settings stored next to the tables, such as a schema version."""
+    row = _properties(path).execute(f"SELECT value FROM {PROPERTIES_TABLE} WHERE key = ?", (key,)).fetchone()
+    return json.loads(row[0]) if row else default
+
+def set_property(path, key, value):
+    conn = _properties(path)
+    with conn:
+        conn.execute(f"INSERT OR REPLACE INTO {PROPERTIES_TABLE} (key, value) VALUES (?, ?)",
+                     (key, json.dumps(value)))
+
+def convert_pickle(pickle_path, path, table="metadata"):
+    """Copy a pickled {vector id: row} dict into a table; returns the number of rows copied."""
+    with open(pickle_path, "rb") as f:
+        legacy = pickle.load(f)
+    store = MetadataStore(path, table)
+    store.put_many(legacy.items())
+    return len(legacy)
+
+def open_metadata(path):
+    """Open a metadata file for reading: a store for .db files, the unpickled dict for a legacy .pkl."""
+    if path.endswith(".pkl"):
+        with open(path, "rb") as f:
+            return pickle.load(f)
+    return MetadataStore(path)
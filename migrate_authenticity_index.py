@@ -0,0 +1,29 @@
+"""
+Migrate the authenticity reference store to the current feature schema.
+
+USAGE:
+    python migrate_authenticity_index.py
+
+Converts an old shared authentic_docs.faiss and/or 100-dim zero-padded
+vectors into per-doc-type partitions of compact vectors, moves the metadata
+from authentic_docs_metadata.pkl into authentic_docs/metadata.db, and records
+the schema version there. The detector does the same
+automatically on first load; this script lets you run it ahead of a deploy.
+"""
+
+import authenticity_features
+from train_authenticity_model import DocumentAuthenticityDetector
+
+def main():
+    detector = DocumentAuthenticityDetector()
+
+    print("\n" + "=" * 60)
+    print(f"Feature schema version: {authenticity_features.SCHEMA_VERSION}")
+    for doc_type, partition in detector.partitions.items():
+        dimension = partition.index.d
+        print(f"  {doc_type}: {partition.index.ntotal} reference vectors x {dimension} floats "
+              f"(was {authenticity_features.LEGACY_VECTOR_DIMENSION})")
+    print("=" * 60)
+
+if __name__ == "__main__":
+    main()
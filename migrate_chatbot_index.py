@@ -0,0 +1,42 @@
+"""
+Rebuild the chatbot index with a different index type.
+
+USAGE:
+    python migrate_chatbot_index.py --type hnsw
+    python migrate_chatbot_index.py --type ivf_pq
+
+Builds an index of the given type from the chatbot_kb segment store and
+saves it as the store's index snapshot (chatbot_kb/index.faiss), the file
+the app loads at startup. Set CHATBOT_INDEX_TYPE to the same type to serve
+it; with a different type the app ignores the snapshot and builds its own
+index from the segments.
+"""
+
+import argparse
+import chatbot_logic
+import vector_index
+
+def main():
+    parser = argparse.ArgumentParser(description="Rebuild the chatbot index with another index type.")
+    parser.add_argument('--type', required=True, choices=vector_index.INDEX_TYPES)
+    args = parser.parse_args()
+
+    kb = chatbot_logic.KnowledgeBase("base", chatbot_logic.STORE_DIR, index_type=args.type)
+    if kb.store.is_empty():
+        print(f"Error: the segment store '{chatbot_logic.STORE_DIR}' is empty. "
+              f"Convert a legacy index first with: python convert_metadata.py")
+        return False
+
+    print(f"Building a {args.type} index from segment store '{chatbot_logic.STORE_DIR}'...")
+    kb.load()
+    if not kb.index.is_trained:
+        print(f"Warning: only {kb.index.ntotal} vectors; {args.type} needs "
+              f"{vector_index.min_training_vectors(args.type)} to train. Saving a flat index until then.")
+
+    kb.write_snapshot()
+    print(f"Wrote {kb.index.ntotal} vectors as {type(kb.index.index).__name__} to "
+          f"'{chatbot_logic.STORE_DIR}'. Start the app with CHATBOT_INDEX_TYPE={args.type} to use it.")
+    return True
+
+if __name__ == "__main__":
+    main()
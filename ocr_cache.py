@@ -0,0 +1,114 @@
+import os
+import json
+import hashlib
+import threading
+from collections import OrderedDict
+
+OCR_CACHE_DIR = os.environ.get('OCR_CACHE_DIR', os.path.join(os.getcwd(), 'ocr_cache'))
+MEMORY_CACHE_ENTRIES = int(os.environ.get('OCR_CACHE_MEMORY_ENTRIES', 128))
+DISK_CACHE_BYTES = int(os.environ.get('OCR_CACHE_DISK_BYTES', 256 * 1024 * 1024))
+
+_memory_cache = OrderedDict()
+_disk_bytes = None
+_lock = threading.Lock()
+
+def file_hash(filepath):
+    digest = hashlib.sha256()
+    with open(filepath, "rb") as f:
+        for block in iter(lambda: f.read(1024 * 1024), b""):
+            digest.update(block)
+    return digest.hexdigest()
+
+def make_key(content_hash, options):
+    config = json.dumps(options, sort_keys=True)
+    return hashlib.sha256(f"{content_hash}:{config}".encode('utf-8')).hexdigest()
+
+def _entry_path(key):
+    return os.path.join(OCR_CACHE_DIR, f"{key}.txt")
+
+def _remember(key, text):
+    _memory_cache[key] = text
+    _memory_cache.move_to_end(key)
+    while len(_memory_cache) > MEMORY_CACHE_ENTRIES:
+        _memory_cache.popitem(last=False)
+
+def get(key):
+    with _lock:
+        if key in _memory_cache:
+            _memory_cache.move_to_end(key)
+            return _memory_cache[key]
+
+    path = _entry_path(key)
+    try:
+        with open(path, "r", encoding="utf-8") as f:
+            text = f.read()
+        # mtime doubles as the last-used time for disk eviction
+        os.utime(path)
+    except OSError:
+        return None
+
+    with _lock:
+        _remember(key, text)
+    return text
+
+def put(key, text):
+    global _disk_bytes
+
+    with _lock:
+        _remember(key, text)
+
+    try:
+        os.makedirs(OCR_CACHE_DIR, exist_ok=True)
+        path = _entry_path(key)
+        tmp_path = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            f.write(text)
+        os.replace(tmp_path, path)
+    except OSError as e:
+        print(f"Warning: could not write OCR cache entry: {e}")
+        return
+
+    with _lock:
+        if _disk_bytes is None:
+            _disk_bytes = _scan_disk_bytes()
+        else:
+            _disk_bytes += os.path.getsize(path)
+        if _disk_bytes > DISK_CACHE_BYTES:
+            _trim_disk()
+
+def _scan_disk_bytes():
+    total = 0
+    for entry in os.scandir(OCR_CACHE_DIR):
+        if entry.name.endswith('.txt'):
+            total += entry.stat().st_size
+    return total
+
+def _trim_disk():
+    global _disk_bytes
+
+    entries = [entry for entry in os.scandir(OCR_CACHE_DIR) if entry.name.endswith('.txt')]
+    entries.sort(key=lambda entry: entry.stat().st_mtime)
+
+    total = sum(entry.stat().st_size for entry in entries)
+    # Trim to 90% so a burst of new entries doesn't rescan on every put
+    target = DISK_CACHE_BYTES * 0.9
+    for entry in entries:
+        if total <= target:
+            break
+        try:
+            size = entry.stat().st_size
+            os.remove(entry.path)
+            total -= size
+        except OSError:
+            pass
+    _disk_bytes = total
+
+def clear():
+    global _disk_bytes
+    with _lock:
+        _memory_cache.clear()
+        if os.path.isdir(OCR_CACHE_DIR):
+            for entry in os.scandir(OCR_CACHE_DIR):
+                if entry.name.endswith('.txt'):
+                    os.remove(entry.path)
+        _disk_bytes = 0
@@ -0,0 +1,265 @@
+import os
+import re
+import shutil
+import subprocess
+import threading
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+import pytesseract
+from pdf2image import convert_from_path, pdfinfo_from_path
+from PIL import Image
+import ocr_cache
+import preprocess
+
+POPPLER_PATH = os.path.join(os.getcwd(), 'poppler-25.07.0', 'Library', 'bin')
+PDFTOTEXT_PATH = os.path.join(POPPLER_PATH, 'pdftotext.exe' if os.name == 'nt' else 'pdftotext')
+TESSERACT_PATH = r'C:\Program Files\Tesseract-OCR\tesseract.exe'
+pytesseract.pytesseract.tesseract_cmd = TESSERACT_PATH
+
+DEFAULT_DPI = 300
+# PDF pages are first rendered at OCR_BASE_DPI and only re-rendered at the
+# full DPI when tesseract's mean word confidence is below OCR_MIN_CONFIDENCE.
+# Set OCR_BASE_DPI=300 to always render at full resolution.
+BASE_DPI = int(os.environ.get('OCR_BASE_DPI', 150))
+MIN_CONFIDENCE = float(os.environ.get('OCR_MIN_CONFIDENCE', 75))
+DEFAULT_CONFIG = '--psm 6 --oem 3'
+OCR_WORKERS = int(os.environ.get('OCR_WORKERS', max(1, (os.cpu_count() or 2) - 1)))
+
+# A page's embedded text layer is used instead of OCR when it has at least
+# this many characters and this share of them are letters, digits or spaces
+# (broken font encodings come out as symbols and control characters).
+TEXT_LAYER_MIN_CHARS = 25
+TEXT_LAYER_MIN_RATIO = 0.75
+
+# For ID documents OCR stops at the first page where the document's number is found
+EARLY_EXIT_PATTERNS = {
+    'PAN': re.compile(r'[A-Z]{5}[0-9]{4}[A-Z]{1}'),
+    'AADHAAR': re.compile(r'\d{4}\s\d{4}\s\d{4}'),
+}
+
+_executor = None
+_executor_lock = threading.Lock()
+
+def get_executor():
+    global _executor
+    if _executor is None:
+        with _executor_lock:
+            if _executor is None:
+                _executor = ProcessPoolExecutor(max_workers=OCR_WORKERS)
+    return _executor
+
+def shutdown_executor():
+    global _executor
+    with _executor_lock:
+        if _executor is not None:
+            _executor.shutdown(wait=False, cancel_futures=True)
+            _executor = None
+
+def preprocess_image(image, doc_type=None):
+    return preprocess.preprocess(image, doc_type)
+
+def ocr_image(image, config=DEFAULT_CONFIG, enhance=True, doc_type=None):
+    if enhance:
+        image = preprocess_image(image, doc_type)
+    return pytesseract.image_to_string(image, config=config)
+
+def _text_from_data(data):
+    """Rebuild image_to_string-style text from image_to_data output."""
+    lines = []
+    current_line = None
+    current_paragraph = None
+    for position, word in enumerate(data['text']):
+        if not word.strip():
+            continue
+        paragraph = (data['block_num'][position], data['par_num'][position])
+        line = paragraph + (data['line_num'][position],)
+        if line != current_line:
+            if current_paragraph is not None and paragraph != current_paragraph:
+                lines.append([])
+            lines.append([])
+            current_line, current_paragraph = line, paragraph
+        lines[-1].append(word)
+    return "\n".join(" ".join(words) for words in lines) + ("\n" if lines else "")
+
+def ocr_image_with_confidence(image, config=DEFAULT_CONFIG, enhance=True, doc_type=None):
+    """Return (text, mean word confidence 0-100) from a single tesseract run."""
+    if enhance:
+        image = preprocess_image(image, doc_type)
+    data = pytesseract.image_to_data(image, config=config, output_type=pytesseract.Output.DICT)
+    confidences = [float(conf) for conf, word in zip(data['conf'], data['text'])
+                   if word.strip() and float(conf) >= 0]
+    confidence = sum(confidences) / len(confidences) if confidences else 0.0
+    return _text_from_data(data), confidence
+
+def count_pdf_pages(filepath):
+    info = pdfinfo_from_path(filepath, poppler_path=POPPLER_PATH)
+    return int(info.get('Pages', 0))
+
+def find_pdftotext():
+    if os.path.exists(PDFTOTEXT_PATH):
+        return PDFTOTEXT_PATH
+    return shutil.which('pdftotext')
+
+def pdf_text_layer(filepath, page_count):
+    """Return the embedded text of each page via pdftotext, or None if it can't be read."""
+    pdftotext = find_pdftotext()
+    if not pdftotext:
+        return None
+    try:
+        result = subprocess.run([pdftotext, '-enc', 'UTF-8', filepath, '-'],
+                                capture_output=True, timeout=120, check=True)
+    except (OSError, subprocess.SubprocessError) as e:
+        print(f"pdftotext failed on {filepath}: {e}")
+        return None
+
+    # pdftotext ends every page with a form feed
+    pages = result.stdout.decode('utf-8', errors='replace').split('\f')[:page_count]
+    return pages + [""] * (page_count - len(pages))
+
+def is_usable_text(text):
+    text = text.strip()
+    if len(text) < TEXT_LAYER_MIN_CHARS:
+        return False
+    readable = sum(1 for c in text if c.isalnum() or c.isspace())
+    return readable / len(text) >= TEXT_LAYER_MIN_RATIO
+
+def render_pdf_page(filepath, page_number, dpi):
+    pages = convert_from_path(filepath, poppler_path=POPPLER_PATH, dpi=dpi,
+                              first_page=page_number, last_page=page_number)
+    return pages[0] if pages else None
+
+def ocr_pdf_page(filepath, page_number, dpi=DEFAULT_DPI, config=DEFAULT_CONFIG, enhance=True, base_dpi=None,
+                 doc_type=None):
+    # Runs inside a pool worker: render just this page so only a file path
+    # crosses the process boundary, not a 300-DPI bitmap.
+    if base_dpi and base_dpi < dpi:
+        image = render_pdf_page(filepath, page_number, base_dpi)
+        if image is None:
+            return ""
+        text, confidence = ocr_image_with_confidence(image, config=config, enhance=enhance, doc_type=doc_type)
+        if confidence >= MIN_CONFIDENCE:
+            return text
+        del image
+
+    image = render_pdf_page(filepath, page_number, dpi)
+    if image is None:
+        return ""
+    return ocr_image(image, config=config, enhance=enhance, doc_type=doc_type)
+
+def extract_pdf_pages(filepath, dpi=DEFAULT_DPI, config=DEFAULT_CONFIG, enhance=True, on_page=None,
+                      base_dpi=None, stop_pattern=None, text_layer=False, doc_type=None, page_key=None):
+    """OCR every page of a PDF in page order.
+
+    With text_layer, pages whose embedded text passes is_usable_text() are
+    taken from it and only the rest are OCR'd. With page_key, a function
+    from page number to OCR cache key, pages already in the cache are not
+    OCR'd again and newly OCR'd ones are added to it. With stop_pattern,
+    pages after the first one whose text matches it are skipped and the
+    returned list ends at that page.
+    """
+    page_count = count_pdf_pages(filepath)
+    layer = pdf_text_layer(filepath, page_count) if text_layer else None
+    known = {page_number: layer[page_number - 1] for page_number in range(1, page_count + 1)
+             if layer and is_usable_text(layer[page_number - 1])}
+    if page_key:
+        for page_number in range(1, page_count + 1):
+            if page_number not in known:
+                cached = ocr_cache.get(page_key(page_number))
+                if cached is not None:
+                    known[page_number] = cached
+    to_ocr = [page_number for page_number in range(1, page_count + 1) if page_number not in known]
+    page_texts = []
+
+    def read_ocr(page_number, text):
+        if page_key:
+            ocr_cache.put(page_key(page_number), text)
+        return text
+
+    if len(to_ocr) <= 1 or OCR_WORKERS <= 1:
+        for page_number in range(1, page_count + 1):
+            if page_number in known:
+                page_texts.append(known[page_number])
+            else:
+                page_texts.append(read_ocr(page_number, ocr_pdf_page(filepath, page_number, dpi, config, enhance,
+                                                                     base_dpi, doc_type)))
+            if on_page:
+                on_page(page_number, page_count)
+            if stop_pattern and stop_pattern.search(page_texts[-1]):
+                break
+        return page_texts
+
+    executor = get_executor()
+    try:
+        futures = {page_number: executor.submit(ocr_pdf_page, filepath, page_number, dpi, config, enhance,
+                                                  base_dpi, doc_type)
+                   for page_number in to_ocr}
+        for page_number in range(1, page_count + 1):
+            if page_number in known:
+                page_texts.append(known[page_number])
+            else:
+                page_texts.append(read_ocr(page_number, futures[page_number].result()))
+            if on_page:
+                on_page(page_number, page_count)
+            if stop_pattern and stop_pattern.search(page_texts[-1]):
+                # Pages already running finish in the background; queued ones never start
+                for pending in futures.values():
+                    pending.cancel()
+                break
+    except BrokenProcessPool:
+        shutdown_executor()
+        raise
+
+    return page_texts
+
+def _cache_key(content_hash, dpi, config, enhance, base_dpi, doc_type, page):
+    # One entry per page of OCR text. The text layer and early exit only
+    # decide which pages get OCR'd, not what OCR reads, so they stay out of
+    # the key: a scanned page OCR'd for verification is reused by the
+    # chatbot. Entries from before 'page' held whole documents and are
+    # simply never looked up again.
+    options = {'dpi': dpi, 'config': config, 'enhance': enhance, 'base_dpi': base_dpi, 'page': page}
+    if enhance and preprocess.profile_name(doc_type) != 'default':
+        options['profile'] = preprocess.profile_name(doc_type)
+    return ocr_cache.make_key(content_hash, options)
+
+def _read_pages(filepath, dpi, config, enhance, on_page, base_dpi, doc_type, text_layer, content_hash):
+    def page_key(page_number):
+        return _cache_key(content_hash, dpi, config, enhance, base_dpi, doc_type, page_number)
+
+    if filepath.lower().endswith('.pdf'):
+        return extract_pdf_pages(filepath, dpi, config, enhance, on_page, base_dpi,
+                                 EARLY_EXIT_PATTERNS.get(doc_type), text_layer, doc_type,
+                                 page_key if content_hash else None)
+    text = ocr_cache.get(page_key(1)) if content_hash else None
+    if text is None:
+        image = Image.open(filepath)
+        text = ocr_image(image, config=config, enhance=enhance, doc_type=doc_type)
+        if content_hash:
+            ocr_cache.put(page_key(1), text)
+    if on_page:
+        on_page(1, 1)
+    return [text]
+
+def extract_text(filepath, dpi=DEFAULT_DPI, config=DEFAULT_CONFIG, enhance=True, on_page=None, use_cache=True,
+                 content_hash=None, base_dpi=BASE_DPI, doc_type=None, text_layer=False):
+    # content_hash is the file's sha256 when the caller already has it (uploads do).
+    # doc_type picks the preprocessing profile, and 'PAN' or 'AADHAAR' also
+    # stops a PDF at the first page carrying the ID number.
+    # text_layer reads born-digital PDF pages from their embedded text. It is
+    # off by default: verification must read what is printed, and a PDF's
+    # hidden text layer can say something else.
+    return "\n".join(extract_pages(filepath, dpi, config, enhance, on_page, use_cache, content_hash, base_dpi,
+                                   doc_type, text_layer))
+
+def extract_pages(filepath, dpi=DEFAULT_DPI, config=DEFAULT_CONFIG, enhance=True, on_page=None, use_cache=True,
+                  content_hash=None, base_dpi=BASE_DPI, doc_type=None, text_layer=False):
+    """Like extract_text, but return one string per page (an image is one page).
+
+    OCR results are cached per page, so either call reuses pages the other
+    has read.
+    """
+    if use_cache:
+        content_hash = content_hash or ocr_cache.file_hash(filepath)
+    else:
+        content_hash = None
+    return _read_pages(filepath, dpi, config, enhance, on_page, base_dpi, doc_type, text_layer, content_hash)
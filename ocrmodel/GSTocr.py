@@ -1,24 +1,50 @@
+"""
+Bulk GST certificate extraction into gst_index.faiss / gst_metadata.db.
+
+USAGE (from the project root):
+    python ocrmodel/GSTocr.py
+    python ocrmodel/GSTocr.py --pattern "gst_batch/*.pdf" --checkpoint-every 50
+
+Files are OCR'd in parallel and their fields read by gst_extractor's
+rules. Only certificates with fields the rules could not fill go to the
+LLM, a few at a time, and only for those fields. Every --checkpoint-every
+documents the new entries are embedded and the index and metadata are
+written to disk. Each entry records the
+sha256 of its file, so a re-run (or a run restarted after a crash) skips
+everything already indexed and picks up where it stopped.
+"""
+
 import os
+import sys
 import glob
-import pickle
-import numpy as np
-import faiss
 import json
-import pytesseract
-from pdf2image import convert_from_path
+import argparse
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
+import faiss
 import ollama
-import time
 
-POPPLER_PATH = r"C:\Users\Hardik\OneDrive\Desktop\ZED_FRONTEND\poppler-25.07.0\Library\bin" 
+# The OCR and embedding helpers live in the project root
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+import ocr_engine
+import ocr_cache
+import chatbot_logic
+import gst_extractor
+import gst_registry
+import metadata_store
 
+# Embeddings come from chatbot_logic.embed_texts (same qwen model)
 TEXT_MODEL_NAME = 'qwen:1.8b'
-EMBEDDING_MODEL_NAME = 'qwen:1.8b'
 
 VECTOR_DIMENSION = 2048
 
-index = faiss.IndexFlatL2(VECTOR_DIMENSION)
+INDEX_FILE = "gst_index.faiss"
+METADATA_FILE = gst_registry.GST_METADATA_FILE
+LEGACY_METADATA_FILE = "gst_metadata.pkl"
+UPLOAD_FOLDER_PATH = "static/uploads/*.pdf"
 
-metadata_store = {}
+OCR_THREADS = int(os.environ.get('GST_OCR_THREADS', ocr_engine.OCR_WORKERS))
+LLM_CONCURRENCY = int(os.environ.get('GST_LLM_CONCURRENCY', 2))
+CHECKPOINT_EVERY = int(os.environ.get('GST_CHECKPOINT_EVERY', 25))
 
 EXTRACTION_PROMPT = """
 You are an expert data extraction bot.
@@ -26,101 +52,258 @@ From the raw OCR text of a GST Registration Certificate provided below, extract
 the following fields and return *only* a valid JSON object.
 
 Fields to extract:
-1. legal_name
-2. registration_number (the GSTIN)
-3. trade_name (if any, otherwise 'N/A')
-4. address (the full principal place of business address)
-5. date_of_liability
-6. type_of_registration (Regular, Composition, etc.)
-7. date_of_issue
+{fields}
 
 OCR TEXT:
 ---
 """
 
-def get_structured_data(file_path):
-    print(f"  Extracting text from: {file_path}...")
-    try:
-        images = convert_from_path(file_path, poppler_path=POPPLER_PATH)
-        
-        raw_text = ""
-        for img in images:
-            raw_text += pytesseract.image_to_string(img) + "\n"
-        
-        if not raw_text.strip():
-            print(f"    Warning: No text found in {file_path}. Skipping.")
-            return None
-
-        full_prompt = EXTRACTION_PROMPT + raw_text
-        response = ollama.generate(
-            model=TEXT_MODEL_NAME,
-            prompt=full_prompt,
-            format='json'
-        )
-        
-        llm_response_text = response['response']
-        extracted_data = json.loads(llm_response_text)
-        
-        extracted_data["source_file"] = file_path
-        extracted_data["document_type"] = "GST Registration Certificate"
+def load_database():
+    """Return (index, metadata), resuming from the last checkpoint if there is one."""
+    metadata = metadata_store.MetadataStore(METADATA_FILE)
+    if not os.path.exists(METADATA_FILE) and os.path.exists(LEGACY_METADATA_FILE):
+        print(f"Converting '{LEGACY_METADATA_FILE}' to '{METADATA_FILE}'...")
+        metadata_store.convert_pickle(LEGACY_METADATA_FILE, METADATA_FILE)
+
+    if not os.path.exists(INDEX_FILE):
+        metadata.clear()
+        return faiss.IndexFlatL2(VECTOR_DIMENSION), metadata
+
+    index = faiss.read_index(INDEX_FILE)
+
+    # The index is written before the metadata, so a crash in between leaves
+    # extra vectors at the end; drop them and those files are redone.
+    count = len(metadata)
+    if index.ntotal > count:
+        print(f"Dropping {index.ntotal - count} vectors without metadata from the last checkpoint.")
+        vectors = index.reconstruct_n(0, count)
+        index = faiss.IndexFlatL2(VECTOR_DIMENSION)
+        index.add(vectors)
+
+    # Entries from before content hashes were recorded
+    backfilled = []
+    for vector_id, row in metadata.items():
+        source_file = row.get("source_file", "").replace("\\", os.sep)
+        if "content_hash" not in row and os.path.exists(source_file):
+            row["content_hash"] = ocr_cache.file_hash(source_file)
+            backfilled.append((vector_id, row))
+    metadata.put_many(backfilled)
+
+    if metadata_store.get_property(METADATA_FILE, "embedding") != chatbot_logic.embedding_space():
+        index = rebuild_index(metadata, count)
 
-        print(f"    Successfully extracted data for: {extracted_data.get('legal_name')}")
-        return extracted_data
+    return index, metadata
 
+def rebuild_index(metadata, count):
+    """Re-embed every indexed document with the current endpoint and write the index again.
+
+    Indexes from before the embedding endpoint was recorded were built with
+    ollama.embeddings; appending chatbot_logic.embed_texts vectors to them
+    would mix two embedding spaces in one index.
+    """
+    print(f"Re-embedding {count} indexed documents for {chatbot_logic.embedding_space()}...")
+    rows = [metadata.get(vector_id) or {} for vector_id in range(count)]
+    vectors, kept, last_error = chatbot_logic.embed_texts([content_to_embed(row) for row in rows])
+    if len(kept) < len(rows):
+        raise RuntimeError(f"Could not re-embed {len(rows) - len(kept)} documents: {last_error}")
+    index = faiss.IndexFlatL2(VECTOR_DIMENSION)
+    index.add(vectors)
+    save_database(index, metadata, [])
+    return index
+
+def save_database(index, metadata, rows):
+    """Write the index via a temp file, then add the new (vector id, row) pairs in one transaction."""
+    faiss.write_index(index, INDEX_FILE + ".tmp")
+    os.replace(INDEX_FILE + ".tmp", INDEX_FILE)
+    metadata.put_many(rows)
+    metadata_store.set_property(METADATA_FILE, "embedding", chatbot_logic.embedding_space())
+
+def read_document(file_path, processed):
+    """OCR stage: return (file_path, content_hash, text); text is None for skipped or unreadable files."""
+    try:
+        content_hash = ocr_cache.file_hash(file_path)
+        if content_hash in processed:
+            return file_path, content_hash, None
+        # Portal-issued certificates carry a text layer; scans fall back to OCR
+        text = ocr_engine.extract_text(file_path, content_hash=content_hash, doc_type='GST', text_layer=True)
     except Exception as e:
-        print(f"    Error processing {file_path}: {e}")
-        return None
+        print(f"    Error reading {file_path}: {e}")
+        return file_path, None, None
 
-print("--- Starting Document Processing Pipeline (using local Qwen model) ---")
+    if not text.strip():
+        print(f"    Warning: No text found in {file_path}. Skipping.")
+        return file_path, content_hash, None
+    return file_path, content_hash, text
 
-UPLOAD_FOLDER_PATH = "static/uploads/*.pdf"
-files_to_process = glob.glob(UPLOAD_FOLDER_PATH)
+def build_extraction_prompt(field_names):
+    fields = "\n".join(f"{number}. {gst_extractor.FIELDS[name]}"
+                       for number, name in enumerate(field_names, start=1))
+    return EXTRACTION_PROMPT.format(fields=fields)
 
-if not files_to_process:
-    print(f"Error: No PDF files found at '{UPLOAD_FOLDER_PATH}'.")
-    print("Please check the path.")
-    exit()
+def build_metadata(file_path, content_hash, fields, sources):
+    metadata = dict(fields)
+    metadata["field_sources"] = {name: sources.get(name, "missing") for name in gst_extractor.FIELDS}
+    metadata["source_file"] = file_path
+    metadata["content_hash"] = content_hash
+    metadata["document_type"] = "GST Registration Certificate"
+    return metadata
 
-print(f"Starting processing for {len(files_to_process)} files...")
+def get_structured_data(file_path, content_hash, raw_text, fields, sources):
+    """LLM stage: ask only for the fields the rules missed.
 
-for file_path in files_to_process:
+    Returns (content_hash, metadata), with metadata None on failure.
+    """
+    missing = gst_extractor.missing_fields(fields)
     try:
-        metadata = get_structured_data(file_path)
+        response = ollama.generate(
+            model=TEXT_MODEL_NAME,
+            prompt=build_extraction_prompt(missing) + raw_text,
+            format='json'
+        )
+        llm_data = json.loads(response['response'])
+    except Exception as e:
+        print(f"    Error processing {file_path}: {e}")
+        return content_hash, None
 
-        if metadata is None:
-            continue 
-        
-        content_to_embed = f"""
+    fields, sources = dict(fields), dict(sources)
+    for name in missing:
+        value = llm_data.get(name) if isinstance(llm_data, dict) else None
+        # A GSTIN the checksum rejects is misread or made up; leave it missing
+        if name == "registration_number" and value and not gst_extractor.is_valid_gstin(value):
+            continue
+        if value:
+            fields[name] = value
+            sources[name] = "llm"
+
+    print(f"    Successfully extracted data for: {fields.get('legal_name')}")
+    return content_hash, build_metadata(file_path, content_hash, fields, sources)
+
+def content_to_embed(metadata):
+    return f"""
             GST Registration for {metadata.get('legal_name')}.
             GSTN: {metadata.get('registration_number')}.
             Address: {metadata.get('address')}.
             Registration Type: {metadata.get('type_of_registration')}.
         """
 
-        result = ollama.embeddings(
-            model=EMBEDDING_MODEL_NAME,
-            prompt=content_to_embed
-        )
-        vector = result['embedding']
-        
-        vector_np = np.array([vector]).astype('float32')
+class Pipeline:
+    """OCR -> LLM extraction -> embed and checkpoint, with bounded work in flight at each stage."""
 
-        vector_id = index.ntotal
-        index.add(vector_np)
+    def __init__(self, index, metadata, checkpoint_every=None, llm_concurrency=None):
+        self.index = index
+        self.metadata_store = metadata
+        self.checkpoint_every = checkpoint_every or CHECKPOINT_EVERY
+        self.llm_concurrency = llm_concurrency or LLM_CONCURRENCY
+        self.processed = {row.get("content_hash") for row in metadata.values()} - {None}
+        self.extracted = []
+        self.counts = {"indexed": 0, "skipped": 0, "failed": 0}
 
-        metadata_store[vector_id] = metadata
+    def commit(self):
+        """Embed the documents extracted since the last checkpoint, add them and save."""
+        if not self.extracted:
+            return
+        vectors, kept, last_error = chatbot_logic.embed_texts([content_to_embed(m) for m in self.extracted])
+        if len(kept) < len(self.extracted):
+            print(f"    Could not embed {len(self.extracted) - len(kept)} documents: {last_error}")
+            self.counts["failed"] += len(self.extracted) - len(kept)
+            for position in set(range(len(self.extracted))) - set(kept):
+                self.processed.discard(self.extracted[position]["content_hash"])
 
-        print(f"Successfully processed and indexed ID {vector_id}: {metadata.get('legal_name')}")
-        
-    except Exception as e:
-        print(f"FAILED to process {file_path}: {e}")
+        first_id = self.index.ntotal
+        self.index.add(vectors)
+        rows = [(first_id + row, self.extracted[position]) for row, position in enumerate(kept)]
+        save_database(self.index, self.metadata_store, rows)
+        # gst_metadata.db stays the source of truth; build_gst_registry.py can reload it
+        gst_registry.upsert_many((metadata, vector_id) for vector_id, metadata in rows)
+
+        self.counts["indexed"] += len(kept)
+        self.extracted = []
+        print(f"Checkpoint: {len(self.metadata_store)} documents in '{INDEX_FILE}'.")
+
+    def run(self, files):
+        files = iter(files)
+        ocr_futures, llm_futures = set(), set()
+        try:
+            with ThreadPoolExecutor(max_workers=OCR_THREADS) as ocr_pool, \
+                    ThreadPoolExecutor(max_workers=self.llm_concurrency) as llm_pool:
+                while True:
+                    # Stop reading ahead while the LLM stage is backed up
+                    while len(ocr_futures) < OCR_THREADS * 2 and len(llm_futures) < self.llm_concurrency * 4:
+                        file_path = next(files, None)
+                        if file_path is None:
+                            break
+                        ocr_futures.add(ocr_pool.submit(read_document, file_path, self.processed))
+                    if not ocr_futures and not llm_futures:
+                        break
 
-print("All files processed. Saving databases...")
+                    done, _ = wait(ocr_futures | llm_futures, return_when=FIRST_COMPLETED)
+                    for future in done:
+                        if future in ocr_futures:
+                            ocr_futures.discard(future)
+                            self.on_read(llm_pool, llm_futures, *future.result())
+                        else:
+                            llm_futures.discard(future)
+                            self.on_extracted(*future.result())
+        finally:
+            self.commit()
+        return self.counts
+
+    def on_read(self, llm_pool, llm_futures, file_path, content_hash, text):
+        if content_hash in self.processed:
+            self.counts["skipped"] += 1
+        elif text is None:
+            self.counts["failed"] += 1
+        else:
+            # Claimed now so a duplicate file later in this run is skipped
+            self.processed.add(content_hash)
+            fields, sources = gst_extractor.extract_fields(text)
+            missing = gst_extractor.missing_fields(fields)
+            if not missing:
+                print(f"  Extracted all fields by rules: {file_path}")
+                self.on_extracted(content_hash, build_metadata(file_path, content_hash, fields, sources))
+                return
+            print(f"  Asking the LLM for {', '.join(missing)}: {file_path}...")
+            llm_futures.add(llm_pool.submit(get_structured_data, file_path, content_hash, text, fields, sources))
+
+    def on_extracted(self, content_hash, metadata):
+        if metadata is None:
+            self.processed.discard(content_hash)
+            self.counts["failed"] += 1
+            return
+        self.extracted.append(metadata)
+        if len(self.extracted) >= self.checkpoint_every:
+            self.commit()
 
-faiss.write_index(index, "gst_index.faiss")
+def main():
+    parser = argparse.ArgumentParser(description="Extract GST certificates into the GST index.")
+    parser.add_argument('--pattern', default=UPLOAD_FOLDER_PATH)
+    parser.add_argument('--checkpoint-every', type=int, default=CHECKPOINT_EVERY)
+    parser.add_argument('--llm-concurrency', type=int, default=LLM_CONCURRENCY)
+    args = parser.parse_args()
+
+    print("--- Starting Document Processing Pipeline (using local Qwen model) ---")
+
+    files_to_process = sorted(glob.glob(args.pattern))
+    if not files_to_process:
+        print(f"Error: No PDF files found at '{args.pattern}'.")
+        print("Please check the path.")
+        return False
+
+    index, metadata = load_database()
+    print(f"Starting processing for {len(files_to_process)} files "
+          f"({len(metadata)} documents already indexed)...")
+
+    pipeline = Pipeline(index, metadata, args.checkpoint_every, args.llm_concurrency)
+    try:
+        counts = pipeline.run(files_to_process)
+    finally:
+        ocr_engine.shutdown_executor()
 
-with open("gst_metadata.pkl", "wb") as f:
-    pickle.dump(metadata_store, f)
+    print("Database build complete.")
+    print(f"Indexed {counts['indexed']} new, skipped {counts['skipped']} already indexed, "
+          f"{counts['failed']} failed.")
+    print(f"Total documents indexed: {len(metadata)}")
+    return True
 
-print("Database build complete.")
-print(f"Total documents indexed: {len(metadata_store)}")
\ No newline at end of file
+if __name__ == "__main__":
+    sys.exit(0 if main() else 1)
@@ -1,19 +1,34 @@
-import pickle
+import os
+import sys
 import json
 
-METADATA_FILE = "gst_metadata.pkl"
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+import metadata_store
+
+METADATA_FILE = "gst_metadata.db"
+LEGACY_METADATA_FILE = "gst_metadata.pkl"
+
+# Optional vector ids on the command line print just those rows
+vector_ids = [int(arg) for arg in sys.argv[1:]]
 
 try:
-    with open(METADATA_FILE, "rb") as f:
-        data = pickle.load(f)
+    if not os.path.exists(METADATA_FILE):
+        if os.path.exists(LEGACY_METADATA_FILE):
+            print(f"Found only '{LEGACY_METADATA_FILE}'. Convert it with: python convert_metadata.py")
+        raise FileNotFoundError(METADATA_FILE)
+
+    store = metadata_store.MetadataStore(METADATA_FILE)
+    print(f"Successfully opened metadata in '{METADATA_FILE}'.")
+    print(f"Total documents processed: {len(store)}\n")
 
-    print(f"Successfully loaded metadata from '{METADATA_FILE}'.")
-    print(f"Total documents processed: {len(data)}\n")
-    
-    print(json.dumps(data, indent=2))
+    # Rows are read one id (or one batch) at a time, never the whole file
+    rows = ((vector_id, store.get(vector_id)) for vector_id in vector_ids) if vector_ids else store.items()
+    for vector_id, row in rows:
+        print(f"[{vector_id}]")
+        print(json.dumps(row, indent=2))
 
 except FileNotFoundError:
     print(f"Error: Could not find file '{METADATA_FILE}'.")
     print("Have you run the main script yet?")
 except Exception as e:
-    print(f"An error occurred: {e}")
\ No newline at end of file
+    print(f"An error occurred: {e}")
@@ -0,0 +1,131 @@
+import os
+from fractions import Fraction
+import numpy as np
+from PIL import Image
+
+# Per doc type preprocessing before OCR. 'default' reproduces the old chain
+# of convert('L') -> ImageEnhance.Contrast(2.0) -> ImageEnhance.Sharpness(1.5)
+# pixel for pixel. ID cards are mostly phone photos, so they are deskewed;
+# GST certificates are flat scans that read better binarized.
+PROFILES = {
+    'default': {'contrast': 2.0, 'sharpness': 1.5, 'binarize': False, 'deskew': False},
+    'PAN': {'contrast': 2.0, 'sharpness': 1.5, 'binarize': False, 'deskew': True},
+    'AADHAAR': {'contrast': 2.0, 'sharpness': 1.5, 'binarize': False, 'deskew': True},
+    'GST': {'contrast': 2.0, 'sharpness': 1.5, 'binarize': True, 'deskew': False},
+}
+
+MAX_SKEW_DEGREES = float(os.environ.get('OCR_MAX_SKEW_DEGREES', 5.0))
+SKEW_STEP_DEGREES = 0.5
+# Skew is estimated on a copy scaled down to this width
+SKEW_SAMPLE_WIDTH = 1000
+
+def profile_name(doc_type):
+    return doc_type if doc_type in PROFILES else 'default'
+
+def get_profile(doc_type=None, **overrides):
+    profile = dict(PROFILES[profile_name(doc_type)])
+    profile.update(overrides)
+    return profile
+
+def contrast_table(mean, factor):
+    """Lookup table for ImageEnhance.Contrast: blend each level away from the image mean."""
+    levels = np.arange(256, dtype=np.float32)
+    blended = np.float32(mean) + np.float32(factor) * (levels - np.float32(mean))
+    return np.clip(np.trunc(blended), 0, 255).astype(np.uint8)
+
+def sharpen(pixels, factor):
+    """ImageEnhance.Sharpness on a uint8 array, in place.
+
+    Blends each pixel away from the SMOOTH-filtered image (3x3 kernel, centre
+    weight 5, edges 1, /13, rounded); like PIL, the one-pixel border is left as is.
+    """
+    height, width = pixels.shape
+    if height < 3 or width < 3 or factor == 1:
+        return pixels
+
+    # result = c + (factor - 1) * (c - smooth), kept in integers as a fraction
+    ratio = Fraction(factor).limit_denominator(16)
+    gain, scale = ratio.numerator - ratio.denominator, ratio.denominator
+    dtype = np.int16 if abs(gain) * 255 < np.iinfo(np.int16).max else np.int32
+
+    centre = pixels[1:-1, 1:-1]
+    work = centre.astype(dtype)
+    work *= 5
+    for dy in (0, 1, 2):
+        for dx in (0, 1, 2):
+            if (dy, dx) != (1, 1):
+                work += pixels[dy:dy + height - 2, dx:dx + width - 2]
+    work += 6
+    work //= 13
+    np.subtract(centre, work, out=work)
+    work *= gain
+    work //= scale
+    work += centre
+    np.clip(work, 0, 255, out=work)
+    centre[...] = work
+    return pixels
+
+def otsu_threshold(pixels):
+    histogram = np.bincount(pixels.ravel(), minlength=256).astype(np.float64)
+    levels = np.arange(256)
+    weight_below = np.cumsum(histogram)
+    weight_above = weight_below[-1] - weight_below
+    sum_below = np.cumsum(histogram * levels)
+    mean_below = sum_below / np.maximum(weight_below, 1)
+    mean_above = (sum_below[-1] - sum_below) / np.maximum(weight_above, 1)
+    between = weight_below * weight_above * (mean_below - mean_above) ** 2
+    return int(np.argmax(between))
+
+def binarize(pixels):
+    """Otsu-threshold a uint8 array to 0/255, in place."""
+    threshold = otsu_threshold(pixels)
+    np.greater(pixels, threshold, out=pixels, casting='unsafe')
+    pixels *= 255
+    return pixels
+
+def estimate_skew(image):
+    """Return the rotation in degrees that best levels the text lines of a grayscale image."""
+    sample = image
+    if image.width > SKEW_SAMPLE_WIDTH:
+        sample = image.resize((SKEW_SAMPLE_WIDTH, max(1, image.height * SKEW_SAMPLE_WIDTH // image.width)))
+    ink = np.asarray(sample) < otsu_threshold(np.asarray(sample))
+    ink_image = Image.fromarray(ink.astype(np.uint8) * 255)
+
+    best_angle, best_score = 0.0, None
+    for angle in np.arange(-MAX_SKEW_DEGREES, MAX_SKEW_DEGREES + SKEW_STEP_DEGREES / 2, SKEW_STEP_DEGREES):
+        rows = np.asarray(ink_image.rotate(float(angle), fillcolor=0)).sum(axis=1, dtype=np.int64)
+        # Level text gives sharp peaks (lines) and troughs (gaps) in the row profile
+        score = float(np.var(rows))
+        if best_score is None or score > best_score:
+            best_angle, best_score = float(angle), score
+    return best_angle
+
+def deskew(image):
+    angle = estimate_skew(image)
+    if abs(angle) < SKEW_STEP_DEGREES:
+        return image
+    return image.rotate(angle, resample=Image.BILINEAR, expand=True, fillcolor=255)
+
+def preprocess(image, doc_type=None, **overrides):
+    """Grayscale, contrast and sharpen an image for OCR using one working buffer.
+
+    Optional steps (deskew, binarize) come from the doc type's profile;
+    keyword arguments override single profile settings.
+    """
+    profile = get_profile(doc_type, **overrides)
+    gray = image.convert('L')
+    if profile['deskew']:
+        gray = deskew(gray)
+
+    pixels = np.asarray(gray)
+    if profile['contrast'] != 1:
+        mean = int(pixels.mean() + 0.5)
+        pixels = contrast_table(mean, profile['contrast'])[pixels]
+    else:
+        pixels = pixels.copy()
+    del gray
+
+    sharpen(pixels, profile['sharpness'])
+    if profile['binarize']:
+        binarize(pixels)
+    return Image.fromarray(pixels)
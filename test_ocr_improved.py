@@ -1,8 +1,9 @@
 import os
 from pdf2image import convert_from_path
-from PIL import Image, ImageEnhance, ImageFilter
+from PIL import Image, ImageFilter
 import pytesseract
 import numpy as np
+import preprocess
 
 pytesseract.pytesseract.tesseract_cmd = r'C:\Program Files\Tesseract-OCR\tesseract.exe'
 POPPLER_PATH = os.path.join(os.getcwd(), 'poppler-25.07.0', 'Library', 'bin')
@@ -11,15 +12,7 @@ def preprocess_image(image):
     """
     Enhance image for better OCR results
     """
-    image = image.convert('L')
-    
-    enhancer = ImageEnhance.Contrast(image)
-    image = enhancer.enhance(2.0)
-    
-    enhancer = ImageEnhance.Sharpness(image)
-    image = enhancer.enhance(2.0)
-    
-    return image
+    return preprocess.preprocess(image, sharpness=2.0)
 
 def extract_text_with_preprocessing(filepath):
     """
@@ -0,0 +1,18 @@
+import numpy as np
+import answer_cache
+
+NAMESPACES = ("base",)
+VECTOR = np.ones(8, dtype='float32')
+
+def test_semantic_lookup_is_off_by_default():
+    assert answer_cache.SEMANTIC_CACHE_ENABLED is False
+
+def test_semantic_hit_needs_the_same_retrieved_chunks(monkeypatch):
+    monkeypatch.setattr(answer_cache, "SEMANTIC_CACHE_ENABLED", True)
+    answer_cache.clear()
+    bronze = [("base", 1), ("base", 2)]
+    answer_cache.put(answer_cache.make_key("bronze fee?", bronze), "Rs 10,000", NAMESPACES, VECTOR, bronze)
+
+    assert answer_cache.lookup_similar(VECTOR, NAMESPACES, [("base", 2), ("base", 1)]) == "Rs 10,000"
+    assert answer_cache.lookup_similar(VECTOR, NAMESPACES, [("base", 3), ("base", 4)]) is None
+    answer_cache.clear()
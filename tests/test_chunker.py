@@ -0,0 +1,45 @@
+import re
+import chunker
+
+def words(count, word="alpha"):
+    return " ".join([word] * count) + "."
+
+def test_offsets_point_back_into_the_page_text():
+    pages = ["INTRODUCTION\n" + words(60) + "\n\nSCOPE\n" + words(60, "beta"), words(40, "gamma")]
+    chunks = chunker.chunk_pages(pages, max_tokens=120, overlap_tokens=0)
+
+    for chunk in chunks:
+        if chunk["page"] == chunk["page_end"]:
+            text = pages[chunk["page"] - 1][chunk["start"]:chunk["end"]]
+            assert re.sub(r"[ \t]+", " ", text).strip() == chunk["content"]
+        assert chunk["tokens"] <= 120
+
+def test_a_heading_starts_a_new_section():
+    pages = ["1. Eligibility\n" + words(60) + "\n2. Fees\n" + words(60, "beta")]
+    chunks = chunker.chunk_pages(pages, max_tokens=200, overlap_tokens=0)
+
+    assert [chunk["section"] for chunk in chunks] == ["1. Eligibility", "2. Fees"]
+    assert chunks[1]["content"].startswith("2. Fees")
+
+def test_a_page_break_ends_a_chunk_once_it_holds_a_third_of_the_budget():
+    pages = [words(80), words(80, "beta")]
+    chunks = chunker.chunk_pages(pages, max_tokens=300, overlap_tokens=0)
+
+    assert [(chunk["page"], chunk["page_end"]) for chunk in chunks] == [(1, 1), (2, 2)]
+    assert chunks[1]["start"] == 0
+
+def test_short_pages_share_a_chunk_across_the_break():
+    pages = [words(5), words(5, "beta")]
+    chunks = chunker.chunk_pages(pages, max_tokens=300, overlap_tokens=0)
+
+    assert len(chunks) == 1
+    assert (chunks[0]["page"], chunks[0]["page_end"]) == (1, 2)
+
+def test_a_heading_before_a_long_paragraph_is_never_a_chunk_on_its_own():
+    pages = [words(40) + "\n\nCHAPTER TWO\n" + words(400, "beta")]
+    chunks = chunker.chunk_pages(pages, max_tokens=100, overlap_tokens=0)
+
+    assert all(chunk["content"] != "CHAPTER TWO" for chunk in chunks)
+    heading_chunk = next(chunk for chunk in chunks if "CHAPTER TWO" in chunk["content"])
+    assert "beta" in heading_chunk["content"]
+    assert all(chunk["tokens"] <= 100 for chunk in chunks)
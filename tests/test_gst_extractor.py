@@ -0,0 +1,12 @@
+import gst_extractor
+
+def test_valid_gstin_passes_the_checksum():
+    assert gst_extractor.is_valid_gstin("27AAPFU0939F1ZV")
+    assert not gst_extractor.is_valid_gstin("27AAPFU0939F1ZW")
+
+def test_entity_code_misread_as_a_letter_is_repaired():
+    assert not gst_extractor.is_valid_gstin("33AABTC0738LIZV")
+    assert gst_extractor.repair_gstin("33AABTC0738LIZV") == "33AABTC0738L1ZV"
+
+def test_gstin_is_found_in_ocr_text():
+    assert gst_extractor.find_gstin("GSTIN: 27AAPFU0939F1ZV  Legal Name") == "27AAPFU0939F1ZV"
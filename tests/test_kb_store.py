@@ -0,0 +1,30 @@
+import numpy as np
+import pytest
+import kb_store
+import vector_index
+
+DIMENSION = 16
+
+@pytest.fixture(autouse=True)
+def small_ivf(monkeypatch):
+    # Small enough that the IVF variants train on a few hundred vectors
+    monkeypatch.setattr(vector_index, 'IVF_NLIST', 4)
+    monkeypatch.setattr(vector_index, 'PQ_M', 4)
+    monkeypatch.setattr(vector_index, 'PQ_NBITS', 4)
+
+@pytest.mark.parametrize('index_type', vector_index.INDEX_TYPES)
+def test_snapshot_reloads_and_takes_appends(tmp_path, index_type):
+    rng = np.random.default_rng(0)
+    vectors = rng.random((700, DIMENSION), dtype='float32')
+    store = kb_store.SegmentStore(str(tmp_path / index_type))
+    index = vector_index.VectorIndex(DIMENSION, index_type)
+    index.add(vectors)
+    store.append(vectors, [{'content': str(i)} for i in range(len(vectors))])
+    store.write_index_snapshot(index.index, index_type)
+
+    snapshot, covered = kb_store.SegmentStore(store.directory).read_index_snapshot(index_type)
+    assert covered == store.segments
+    reloaded = vector_index.VectorIndex(DIMENSION, index_type)
+    reloaded.adopt(snapshot)
+    reloaded.add(rng.random((5, DIMENSION), dtype='float32'))
+    assert reloaded.ntotal == 705
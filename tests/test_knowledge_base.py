@@ -0,0 +1,31 @@
+import numpy as np
+import pytest
+import chatbot_logic
+
+def random_vectors(count):
+    return np.random.default_rng(count).random((count, chatbot_logic.VECTOR_DIMENSION), dtype='float32')
+
+def test_rejected_vectors_are_not_written_to_the_store(tmp_path, monkeypatch):
+    kb = chatbot_logic.KnowledgeBase("base", str(tmp_path))
+    kb.add(random_vectors(3), [{"content": str(i)} for i in range(3)])
+
+    def fail(vectors):
+        raise RuntimeError("index rejected the vectors")
+    monkeypatch.setattr(kb.index, "add", fail)
+    with pytest.raises(RuntimeError):
+        kb.add(random_vectors(2), [{"content": "x"}] * 2)
+
+    assert kb.store.row_count == 3
+    assert len(kb.store.segments) == 1
+
+def test_failed_append_leaves_the_index_in_step_with_the_store(tmp_path, monkeypatch):
+    kb = chatbot_logic.KnowledgeBase("base", str(tmp_path))
+    kb.add(random_vectors(3), [{"content": str(i)} for i in range(3)])
+
+    def fail(*args):
+        raise OSError("disk full")
+    monkeypatch.setattr(kb.store, "append", fail)
+    with pytest.raises(OSError):
+        kb.add(random_vectors(2), [{"content": "x"}] * 2)
+
+    assert kb.index.ntotal == kb.store.row_count == 3
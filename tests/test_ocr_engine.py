@@ -0,0 +1,36 @@
+import ocr_cache
+import ocr_engine
+
+SCANNED = "Scanned page"
+EMBEDDED = "Embedded text layer of a born-digital page, long enough to be usable. " * 3
+
+def fake_pdf(tmp_path, monkeypatch, layer):
+    monkeypatch.setattr(ocr_cache, "OCR_CACHE_DIR", str(tmp_path / "cache"))
+    monkeypatch.setattr(ocr_cache, "_memory_cache", ocr_cache.OrderedDict())
+    monkeypatch.setattr(ocr_engine, "OCR_WORKERS", 1)
+    monkeypatch.setattr(ocr_engine, "count_pdf_pages", lambda filepath: len(layer))
+    monkeypatch.setattr(ocr_engine, "pdf_text_layer", lambda filepath, page_count: list(layer))
+    calls = []
+
+    def ocr_pdf_page(filepath, page_number, *args):
+        calls.append(page_number)
+        return f"{SCANNED} {page_number}"
+    monkeypatch.setattr(ocr_engine, "ocr_pdf_page", ocr_pdf_page)
+
+    path = tmp_path / "doc.pdf"
+    path.write_bytes(b"%PDF-1.4 test")
+    return str(path), calls
+
+def test_text_layer_reuses_pages_ocrd_without_it(tmp_path, monkeypatch):
+    filepath, calls = fake_pdf(tmp_path, monkeypatch, ["", EMBEDDED])
+
+    assert ocr_engine.extract_pages(filepath) == [f"{SCANNED} 1", f"{SCANNED} 2"]
+    assert ocr_engine.extract_pages(filepath, text_layer=True) == [f"{SCANNED} 1", EMBEDDED]
+    assert calls == [1, 2]
+
+def test_pages_ocrd_for_the_text_layer_are_reused_without_it(tmp_path, monkeypatch):
+    filepath, calls = fake_pdf(tmp_path, monkeypatch, ["", EMBEDDED])
+
+    ocr_engine.extract_pages(filepath, text_layer=True)
+    assert ocr_engine.extract_text(filepath) == f"{SCANNED} 1\n{SCANNED} 2"
+    assert calls == [1, 2]
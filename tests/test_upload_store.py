@@ -0,0 +1,34 @@
+import io
+import os
+import pytest
+from werkzeug.datastructures import FileStorage
+import upload_store
+
+@pytest.fixture(autouse=True)
+def upload_folder(tmp_path, monkeypatch):
+    monkeypatch.setattr(upload_store, "UPLOAD_FOLDER", str(tmp_path))
+    return tmp_path
+
+def upload(data, filename):
+    return FileStorage(io.BytesIO(data), filename)
+
+def test_same_bytes_are_stored_once_whatever_the_jpeg_extension(upload_folder):
+    first = upload_store.save_upload(upload(b"image", "scan.jpeg"))
+    second = upload_store.save_upload(upload(b"image", "scan.JPG"))
+
+    assert first.filepath == second.filepath
+    assert first.filepath.endswith(".jpg")
+    assert (first.is_new, second.is_new) == (True, False)
+    assert os.listdir(upload_folder) == [os.path.basename(first.filepath)]
+
+@pytest.mark.parametrize("filename", ["page.html", "logo.svg", "noextension"])
+def test_other_file_types_are_rejected(upload_folder, filename):
+    with pytest.raises(upload_store.UnsupportedUpload):
+        upload_store.save_upload(upload(b"<script>alert(1)</script>", filename))
+    assert os.listdir(upload_folder) == []
+
+def test_oversized_upload_leaves_nothing_behind(upload_folder, monkeypatch):
+    monkeypatch.setattr(upload_store, "MAX_UPLOAD_BYTES", 4)
+    with pytest.raises(upload_store.UploadTooLarge):
+        upload_store.save_upload(upload(b"too large", "scan.pdf"))
+    assert os.listdir(upload_folder) == []
@@ -0,0 +1,57 @@
+import os
+import tempfile
+from pdf2image import convert_from_path
+from PIL import Image, ImageOps
+import ocr_engine
+
+THUMBNAIL_DIR = os.path.join('static', 'thumbnails')
+THUMBNAIL_SIZE = (480, 480)
+THUMBNAIL_QUALITY = 80
+# Thumbnails are named by the upload's content hash, so a URL never changes meaning
+THUMBNAIL_MAX_AGE = 365 * 24 * 3600
+
+def thumbnail_path(digest):
+    return os.path.join(THUMBNAIL_DIR, f"{digest}.jpg")
+
+def render_preview(filepath):
+    """Return a PIL image of the first page of a PDF, or of the image itself, at thumbnail size."""
+    if filepath.lower().endswith('.pdf'):
+        # Ask poppler for the target width directly instead of rasterising at full DPI
+        pages = convert_from_path(filepath, poppler_path=ocr_engine.POPPLER_PATH, first_page=1, last_page=1,
+                                  size=(THUMBNAIL_SIZE[0], None))
+        if not pages:
+            raise ValueError(f"No pages rendered from {filepath}")
+        image = pages[0]
+    else:
+        image = Image.open(filepath)
+        # Lets the JPEG decoder scale down by 1/2, 1/4 or 1/8 while decoding
+        image.draft('RGB', THUMBNAIL_SIZE)
+        image = ImageOps.exif_transpose(image)
+
+    image.thumbnail(THUMBNAIL_SIZE)
+    return image.convert('RGB')
+
+def generate_thumbnail(filepath, digest):
+    """Write the thumbnail for an upload once and return its path."""
+    target = thumbnail_path(digest)
+    if os.path.exists(target):
+        return target
+
+    os.makedirs(THUMBNAIL_DIR, exist_ok=True)
+    image = render_preview(filepath)
+    fd, tmp_path = tempfile.mkstemp(prefix='.thumb-', suffix='.jpg', dir=THUMBNAIL_DIR)
+    try:
+        with os.fdopen(fd, 'wb') as out:
+            image.save(out, 'JPEG', quality=THUMBNAIL_QUALITY, optimize=True)
+        os.replace(tmp_path, target)
+    except BaseException:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        raise
+    return target
+
+def run_thumbnail_job(job, filepath, digest):
+    job.start_stage('thumbnail')
+    path = generate_thumbnail(filepath, digest)
+    job.finish_stage()
+    return {'status': 'success', 'thumbnail': path.replace('\\', '/')}
@@ -2,70 +2,129 @@ import os
 import numpy as np
 import faiss
 import pickle
-import pytesseract
-from pdf2image import convert_from_path
-from PIL import Image
-import re
 import json
 from datetime import datetime
+from concurrent.futures import ThreadPoolExecutor, as_completed
+import ocr_engine
+import authenticity_features
+import metadata_store
 
-POPPLER_PATH = os.path.join(os.getcwd(), 'poppler-25.07.0', 'Library', 'bin')
-TESSERACT_PATH = r'C:\Program Files\Tesseract-OCR\tesseract.exe'
-pytesseract.pytesseract.tesseract_cmd = TESSERACT_PATH
 
 AUTHENTIC_DOCS_INDEX = "authentic_docs.faiss"
 AUTHENTIC_DOCS_METADATA = "authentic_docs_metadata.pkl"
-VECTOR_DIMENSION = 100
+AUTHENTIC_DOCS_PARTITION_DIR = "authentic_docs"
+# One table of rows per doc type; the feature schema version is a file property
+AUTHENTIC_DOCS_METADATA_DB = os.path.join(AUTHENTIC_DOCS_PARTITION_DIR, "metadata.db")
+
+class ReferencePartition:
+    """Reference vectors and metadata for a single document type."""
+    
+    def __init__(self, doc_type, index=None):
+        self.doc_type = doc_type
+        if index is None:
+            index = faiss.IndexFlatL2(authenticity_features.feature_dimension(doc_type))
+        self.index = index
+        self.metadata_store = metadata_store.MetadataStore(AUTHENTIC_DOCS_METADATA_DB, doc_type)
+    
+    @property
+    def index_path(self):
+        return os.path.join(AUTHENTIC_DOCS_PARTITION_DIR, f"{self.doc_type}.faiss")
 
 class DocumentAuthenticityDetector:
     def __init__(self):
-        self.index = None
-        self.metadata_store = {}
+        self.partitions = {}
         self.load_or_create_index()
     
     def load_or_create_index(self):
-        if os.path.exists(AUTHENTIC_DOCS_INDEX) and os.path.exists(AUTHENTIC_DOCS_METADATA):
-            print("Loading existing authenticity index...")
-            self.index = faiss.read_index(AUTHENTIC_DOCS_INDEX)
-            with open(AUTHENTIC_DOCS_METADATA, "rb") as f:
-                self.metadata_store = pickle.load(f)
-        else:
+        schema_version = None
+        if os.path.exists(AUTHENTIC_DOCS_METADATA_DB):
+            # Written last by save_index, so it also marks a finished conversion
+            schema_version = metadata_store.get_property(AUTHENTIC_DOCS_METADATA_DB, "schema_version")
+        
+        if schema_version is None:
+            if os.path.exists(AUTHENTIC_DOCS_METADATA):
+                self.convert_metadata_pickle()
+                return
             print("Creating new authenticity index...")
-            self.index = faiss.IndexFlatL2(VECTOR_DIMENSION)
-            self.metadata_store = {}
+            self.partitions = {}
+            return
+        
+        print("Loading existing authenticity index...")
+        self.partitions = {}
+        for doc_type in metadata_store.list_tables(AUTHENTIC_DOCS_METADATA_DB):
+            partition = ReferencePartition(doc_type)
+            if os.path.exists(partition.index_path):
+                partition.index = faiss.read_index(partition.index_path)
+            self.partitions[doc_type] = partition
+        
+        if schema_version != authenticity_features.SCHEMA_VERSION:
+            self.migrate_feature_schema(schema_version)
+    
+    def convert_metadata_pickle(self):
+        """Move authentic_docs_metadata.pkl into the SQLite metadata file, then load from that."""
+        print(f"Converting '{AUTHENTIC_DOCS_METADATA}' to '{AUTHENTIC_DOCS_METADATA_DB}'...")
+        with open(AUTHENTIC_DOCS_METADATA, "rb") as f:
+            metadata = pickle.load(f)
+        # Start over from the pickle if an earlier conversion was interrupted
+        for doc_type in metadata_store.list_tables(AUTHENTIC_DOCS_METADATA_DB):
+            metadata_store.MetadataStore(AUTHENTIC_DOCS_METADATA_DB, doc_type).clear()
+        
+        if "partitions" not in metadata:
+            self.migrate_single_index(metadata)
+            return
+        
+        for doc_type, rows in metadata["partitions"].items():
+            metadata_store.MetadataStore(AUTHENTIC_DOCS_METADATA_DB, doc_type).put_many(rows.items())
+        metadata_store.set_property(AUTHENTIC_DOCS_METADATA_DB, "schema_version",
+                                    metadata.get("schema_version", 1))
+        self.load_or_create_index()
+    
+    def migrate_feature_schema(self, from_version):
+        """Rewrite every partition's vectors in the current feature schema."""
+        print(f"Migrating authenticity vectors from feature schema v{from_version} "
+              f"to v{authenticity_features.SCHEMA_VERSION}...")
+        for partition in self.partitions.values():
+            vectors = partition.index.reconstruct_n(0, partition.index.ntotal)
+            vectors = authenticity_features.migrate_vectors(vectors, partition.doc_type, from_version)
+            partition.index = faiss.IndexFlatL2(authenticity_features.feature_dimension(partition.doc_type))
+            if len(vectors):
+                partition.index.add(vectors)
+        self.save_index()
+    
+    def migrate_single_index(self, legacy_metadata):
+        """Split the old shared authentic_docs.faiss into one partition per doc type."""
+        print("Migrating authenticity index to per-doc-type partitions...")
+        self.partitions = {}
+        if not os.path.exists(AUTHENTIC_DOCS_INDEX):
+            return
+        legacy_index = faiss.read_index(AUTHENTIC_DOCS_INDEX)
+        for vector_id in range(legacy_index.ntotal):
+            meta = legacy_metadata.get(vector_id)
+            if meta is None:
+                continue
+            partition = self.get_partition(meta["doc_type"])
+            partition.metadata_store[partition.index.ntotal] = meta
+            vector = legacy_index.reconstruct(vector_id).reshape(1, -1)
+            partition.index.add(authenticity_features.migrate_vectors(vector, partition.doc_type, 1))
+        for partition in self.partitions.values():
+            self.save_index(partition)
+    
+    def get_partition(self, doc_type, create=True):
+        if doc_type not in self.partitions and create:
+            self.partitions[doc_type] = ReferencePartition(doc_type)
+        return self.partitions.get(doc_type)
+    
+    @property
+    def total_documents(self):
+        return sum(partition.index.ntotal for partition in self.partitions.values())
     
     def extract_text_from_file(self, filepath):
-        from PIL import ImageEnhance
+        def report_page(page_number, page_count):
+            if filepath.lower().endswith('.pdf'):
+                print(f"  Page {page_number}/{page_count} done")
         
-        text = ""
         try:
-            if filepath.lower().endswith('.pdf'):
-                pages = convert_from_path(filepath, poppler_path=POPPLER_PATH, dpi=300)
-                print(f"  Converted PDF to {len(pages)} page(s)")
-                
-                for i, page in enumerate(pages):
-                    page = page.convert('L')
-                    
-                    enhancer = ImageEnhance.Contrast(page)
-                    page = enhancer.enhance(2.0)
-                    
-                    enhancer = ImageEnhance.Sharpness(page)
-                    page = enhancer.enhance(1.5)
-                    
-                    page_text = pytesseract.image_to_string(page, config='--psm 6 --oem 3')
-                    text += page_text + "\n"
-                    print(f"  Page {i+1}: Extracted {len(page_text)} characters")
-            else:
-                image = Image.open(filepath)
-                image = image.convert('L')
-                
-                enhancer = ImageEnhance.Contrast(image)
-                image = enhancer.enhance(2.0)
-                
-                enhancer = ImageEnhance.Sharpness(image)
-                image = enhancer.enhance(1.5)
-                
-                text = pytesseract.image_to_string(image, config='--psm 6 --oem 3')
+            text = ocr_engine.extract_text(filepath, on_page=report_page)
         except Exception as e:
             print(f"Error extracting text from {filepath}: {e}")
             import traceback
@@ -80,53 +139,10 @@ class DocumentAuthenticityDetector:
         return text.strip()
     
     def extract_features(self, text, doc_type):
-        features = []
-        
-        if doc_type == "PAN":
-            pan_pattern = r'[A-Z]{5}[0-9]{4}[A-Z]{1}'
-            pan_match = re.search(pan_pattern, text)
-            features.append(1.0 if pan_match else 0.0)
-            
-            keywords = ['PERMANENT ACCOUNT NUMBER', 'INCOME TAX DEPARTMENT', 'GOVT. OF INDIA']
-            for keyword in keywords:
-                features.append(1.0 if keyword in text.upper() else 0.0)
-            
-            dob_pattern = r'\d{2}/\d{2}/\d{4}'
-            features.append(1.0 if re.search(dob_pattern, text) else 0.0)
-            
-            name_pattern = r'[A-Z][a-z]+ [A-Z][a-z]+'
-            features.append(1.0 if re.search(name_pattern, text) else 0.0)
-            
-        elif doc_type == "AADHAAR":
-            aadhaar_pattern = r'\d{4}\s\d{4}\s\d{4}'
-            features.append(1.0 if re.search(aadhaar_pattern, text) else 0.0)
-            
-            keywords = ['UIDAI', 'UNIQUE IDENTIFICATION', 'AADHAAR']
-            for keyword in keywords:
-                features.append(1.0 if keyword in text.upper() else 0.0)
-            
-            dob_pattern = r'\d{2}/\d{2}/\d{4}'
-            features.append(1.0 if re.search(dob_pattern, text) else 0.0)
-            
-            address_indicators = ['S/O', 'D/O', 'W/O', 'C/O']
-            features.append(1.0 if any(ind in text.upper() for ind in address_indicators) else 0.0)
-        
-        text_length = len(text)
-        features.append(min(text_length / 1000.0, 1.0))
-        
-        word_count = len(text.split())
-        features.append(min(word_count / 100.0, 1.0))
-        
-        uppercase_ratio = sum(1 for c in text if c.isupper()) / max(len(text), 1)
-        features.append(uppercase_ratio)
-        
-        digit_ratio = sum(1 for c in text if c.isdigit()) / max(len(text), 1)
-        features.append(digit_ratio)
-        
-        while len(features) < VECTOR_DIMENSION:
-            features.append(0.0)
-        
-        return np.array(features[:VECTOR_DIMENSION], dtype=np.float32)
+        return authenticity_features.extract_features(text, doc_type)
+    
+    def extract_features_batch(self, texts, doc_types):
+        return authenticity_features.extract_features_batch(texts, doc_types)
     
     def train_on_authentic_document(self, filepath, doc_type):
         print(f"\nTraining on authentic {doc_type} document: {filepath}")
@@ -141,10 +157,11 @@ class DocumentAuthenticityDetector:
         features = self.extract_features(text, doc_type)
         features_2d = features.reshape(1, -1)
         
-        vector_id = self.index.ntotal
-        self.index.add(features_2d)
+        partition = self.get_partition(doc_type)
+        vector_id = partition.index.ntotal
+        partition.index.add(features_2d)
         
-        self.metadata_store[vector_id] = {
+        partition.metadata_store[vector_id] = {
             "filepath": filepath,
             "doc_type": doc_type,
             "text_length": len(text),
@@ -152,8 +169,8 @@ class DocumentAuthenticityDetector:
             "trained_at": datetime.now().isoformat()
         }
         
-        self.save_index()
-        print(f"Successfully trained! Document ID: {vector_id}")
+        self.save_index(partition)
+        print(f"Successfully trained! Document ID: {doc_type}/{vector_id}")
         return True
     
     def verify_document(self, filepath, doc_type):
@@ -167,43 +184,103 @@ class DocumentAuthenticityDetector:
                 "reason": "Failed to extract text from document"
             }
         
-        features = self.extract_features(text, doc_type)
-        features_2d = features.reshape(1, -1)
+        return self.score_texts([text], [doc_type])[0]
+    
+    def score_texts(self, texts, doc_types):
+        """Score already-extracted texts, running one search per doc type partition."""
+        results = [None] * len(texts)
+        threshold = 0.6
         
-        if self.index.ntotal == 0:
-            return {
-                "is_authentic": False,
-                "confidence": 0.0,
-                "reason": "No authentic documents in database. Please train the model first."
-            }
+        for doc_type in set(doc_types):
+            rows = [row for row, row_type in enumerate(doc_types) if row_type == doc_type]
+            partition = self.get_partition(doc_type, create=False)
+            
+            if partition is None or partition.index.ntotal == 0:
+                for row in rows:
+                    results[row] = {
+                        "is_authentic": False,
+                        "confidence": 0.0,
+                        "reason": f"No authentic {doc_type} documents in database. Please train the model first."
+                    }
+                continue
+            
+            k = min(3, partition.index.ntotal)
+            features = self.extract_features_batch([texts[row] for row in rows], doc_type)
+            distances, indices = partition.index.search(features, k)
+            
+            for position, row in enumerate(rows):
+                avg_distance = np.mean(distances[position])
+                similarity_score = 1 / (1 + avg_distance)
+                is_authentic = similarity_score >= threshold
+                
+                matched_docs = []
+                for idx in indices[position]:
+                    if idx != -1 and idx in partition.metadata_store:
+                        matched_docs.append(partition.metadata_store[idx])
+                
+                results[row] = {
+                    "is_authentic": bool(is_authentic),
+                    "confidence": float(similarity_score),
+                    "avg_distance": float(avg_distance),
+                    "threshold": threshold,
+                    "matched_documents": matched_docs,
+                    "reason": "Document appears authentic" if is_authentic else "Document shows signs of being fake or altered"
+                }
         
-        k = min(3, self.index.ntotal)
-        distances, indices = self.index.search(features_2d, k)
+        return results
+    
+    def verify_documents(self, documents, batch_size=64, ocr_workers=None):
+        """Verify many (filepath, doc_type) pairs, yielding (filepath, doc_type, result).
         
-        avg_distance = np.mean(distances[0])
-        similarity_score = 1 / (1 + avg_distance)
+        Files are OCR'd in parallel; every batch_size finished files are
+        scored together and yielded, so results stream back while the rest
+        of the batch is still being read.
+        """
+        def read(filepath):
+            try:
+                return ocr_engine.extract_text(filepath).strip()
+            except Exception as e:
+                print(f"Error extracting text from {filepath}: {e}")
+                return ""
         
-        threshold = 0.6
-        is_authentic = similarity_score >= threshold
-        
-        matched_docs = []
-        for idx in indices[0]:
-            if idx != -1 and idx in self.metadata_store:
-                matched_docs.append(self.metadata_store[idx])
-        
-        return {
-            "is_authentic": is_authentic,
-            "confidence": float(similarity_score),
-            "avg_distance": float(avg_distance),
-            "threshold": threshold,
-            "matched_documents": matched_docs,
-            "reason": "Document appears authentic" if is_authentic else "Document shows signs of being fake or altered"
-        }
+        pending = []
+        
+        def flush():
+            readable = [(filepath, doc_type, text) for filepath, doc_type, text in pending if text]
+            scores = self.score_texts([text for _, _, text in readable],
+                                      [doc_type for _, doc_type, _ in readable]) if readable else []
+            for (filepath, doc_type, _), result in zip(readable, scores):
+                yield filepath, doc_type, result
+            for filepath, doc_type, text in pending:
+                if not text:
+                    yield filepath, doc_type, {
+                        "is_authentic": False,
+                        "confidence": 0.0,
+                        "reason": "Failed to extract text from document"
+                    }
+            pending.clear()
+        
+        with ThreadPoolExecutor(max_workers=ocr_workers or ocr_engine.OCR_WORKERS) as pool:
+            futures = {pool.submit(read, filepath): (filepath, doc_type) for filepath, doc_type in documents}
+            for future in as_completed(futures):
+                filepath, doc_type = futures[future]
+                pending.append((filepath, doc_type, future.result()))
+                if len(pending) >= batch_size:
+                    yield from flush()
+        
+        yield from flush()
     
-    def save_index(self):
-        faiss.write_index(self.index, AUTHENTIC_DOCS_INDEX)
-        with open(AUTHENTIC_DOCS_METADATA, "wb") as f:
-            pickle.dump(self.metadata_store, f)
+    def save_index(self, partition=None):
+        """Write one partition's index (or all of them) and record the feature schema version.
+        
+        Metadata rows are written to AUTHENTIC_DOCS_METADATA_DB as they are added.
+        """
+        os.makedirs(AUTHENTIC_DOCS_PARTITION_DIR, exist_ok=True)
+        partitions = [partition] if partition else list(self.partitions.values())
+        for item in partitions:
+            faiss.write_index(item.index, item.index_path)
+        metadata_store.set_property(AUTHENTIC_DOCS_METADATA_DB, "schema_version",
+                                    authenticity_features.SCHEMA_VERSION)
         print("Index saved successfully")
 
 def main():
@@ -227,7 +304,7 @@ def main():
     
     print("\n" + "=" * 60)
     print("Training complete!")
-    print(f"Total authentic documents in database: {detector.index.ntotal}")
+    print(f"Total authentic documents in database: {detector.total_documents}")
     print("=" * 60)
     
     print("\n[TESTING PHASE]")
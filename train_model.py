@@ -8,8 +8,8 @@ HOW TO USE:
 1. Make sure you have 'pan card.pdf' and 'aadhar card.pdf' in the main folder
 2. Run this script: python train_authenticity_model.py
 3. The script will create:
-   - authentic_docs.faiss (Feature database)
-   - authentic_docs_metadata.pkl (Document metadata)
+   - authentic_docs/<doc type>.faiss (Feature database)
+   - authentic_docs/metadata.db (Document metadata)
 
 Once trained, your chatbot will automatically detect fake documents!
 
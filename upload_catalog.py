@@ -0,0 +1,137 @@
+import os
+import threading
+import time
+import metadata_store
+import ocr_cache
+
+CATALOG_DB = os.environ.get('UPLOAD_CATALOG_DB', 'upload_catalog.db')
+UPLOAD_FOLDER = os.path.join('static', 'uploads')
+SUPPORTED_EXTENSIONS = ('.pdf', '.jpg', '.jpeg', '.png')
+PAGE_SIZE = 48
+BACKFILL_VERSION = 1
+
+DOC_TYPES = ('pan', 'aadhaar', 'gst', 'other')
+# generate_verification_report's document_type -> gallery doc type
+REPORT_DOC_TYPES = {'PAN Card': 'pan', 'Aadhaar Card': 'aadhaar', 'GST Certificate': 'gst'}
+STATUS_CLASSES = {'status-verified': 'verified', 'status-minor': 'minor', 'status-review': 'review'}
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS uploads (
+    digest TEXT PRIMARY KEY,
+    filename TEXT NOT NULL,
+    path TEXT NOT NULL,
+    size INTEGER NOT NULL,
+    mtime REAL NOT NULL,
+    doc_type TEXT NOT NULL,
+    format TEXT NOT NULL,
+    status TEXT NOT NULL DEFAULT 'pending'
+);
+CREATE INDEX IF NOT EXISTS uploads_by_mtime ON uploads (mtime DESC);
+CREATE INDEX IF NOT EXISTS uploads_by_type ON uploads (doc_type, mtime DESC);
+CREATE INDEX IF NOT EXISTS uploads_by_format ON uploads (format, mtime DESC);
+"""
+
+_init_lock = threading.Lock()
+_initialized = False
+
+def guess_doc_type(filename):
+    name = filename.lower()
+    if 'pan' in name or (len(filename) == 14 and name.endswith(('.jpg', '.jpeg', '.png'))):
+        return 'pan'
+    if 'aadhar' in name or 'aadhaar' in name:
+        return 'aadhaar'
+    if 'gst' in name:
+        return 'gst'
+    return 'other'
+
+def file_format(filename):
+    return 'pdf' if filename.lower().endswith('.pdf') else 'image'
+
+def get_connection():
+    global _initialized
+    conn = metadata_store.connect(CATALOG_DB)
+    if not _initialized:
+        with _init_lock:
+            if not _initialized:
+                conn.executescript(SCHEMA)
+                conn.commit()
+                _initialized = True
+    return conn
+
+def record_upload(stored):
+    """Add a freshly stored upload (an upload_store.StoredUpload), or bump a re-upload to the top."""
+    conn = get_connection()
+    with conn:
+        conn.execute(
+            "INSERT INTO uploads (digest, filename, path, size, mtime, doc_type, format) "
+            "VALUES (?, ?, ?, ?, ?, ?, ?) "
+            "ON CONFLICT(digest) DO UPDATE SET filename = excluded.filename, mtime = excluded.mtime",
+            (stored.digest, stored.filename, stored.filepath.replace('\\', '/'), stored.size,
+             time.time(), guess_doc_type(stored.filename), file_format(stored.filename)))
+
+def get_upload(digest):
+    row = get_connection().execute("SELECT * FROM uploads WHERE digest = ?", (digest,)).fetchone()
+    return dict(row) if row else None
+
+def set_status(digest, status, doc_type=None):
+    conn = get_connection()
+    with conn:
+        if doc_type:
+            conn.execute("UPDATE uploads SET status = ?, doc_type = ? WHERE digest = ?", (status, doc_type, digest))
+        else:
+            conn.execute("UPDATE uploads SET status = ? WHERE digest = ?", (status, digest))
+
+def record_verification(digest, report):
+    """Store the outcome of generate_verification_report for an upload."""
+    set_status(digest, STATUS_CLASSES.get(report.get('statusClass'), 'processed'),
+               REPORT_DOC_TYPES.get(report.get('document_type'), 'other'))
+
+def list_uploads(doc_type=None, search=None, page=1, per_page=PAGE_SIZE):
+    """Return (rows, total) for one page of uploads, newest first.
+
+    doc_type is one of DOC_TYPES, or 'pdf' / 'image' to filter by format.
+    search matches anywhere in the original filename.
+    """
+    clauses, params = [], []
+    if doc_type in ('pdf', 'image'):
+        clauses.append("format = ?")
+        params.append(doc_type)
+    elif doc_type in DOC_TYPES:
+        clauses.append("doc_type = ?")
+        params.append(doc_type)
+    if search:
+        clauses.append("filename LIKE ? ESCAPE '\\'")
+        escaped = search.replace('\\', '\\\\').replace('%', '\\%').replace('_', '\\_')
+        params.append(f"%{escaped}%")
+    where = f"WHERE {' AND '.join(clauses)}" if clauses else ""
+
+    conn = get_connection()
+    total = conn.execute(f"SELECT COUNT(*) FROM uploads {where}", params).fetchone()[0]
+    rows = conn.execute(f"SELECT * FROM uploads {where} ORDER BY mtime DESC LIMIT ? OFFSET ?",
+                        params + [per_page, (max(page, 1) - 1) * per_page]).fetchall()
+    return [dict(row) for row in rows], total
+
+def backfill(folder=UPLOAD_FOLDER):
+    """Catalog files that were in the upload folder before the catalog existed.
+
+    Runs once per database; user_version records that it has.
+    """
+    conn = get_connection()
+    if conn.execute("PRAGMA user_version").fetchone()[0] >= BACKFILL_VERSION:
+        return 0
+
+    rows = []
+    for filename in (os.listdir(folder) if os.path.isdir(folder) else []):
+        filepath = os.path.join(folder, filename)
+        if not os.path.isfile(filepath) or not filename.lower().endswith(SUPPORTED_EXTENSIONS):
+            continue
+        stat = os.stat(filepath)
+        rows.append((ocr_cache.file_hash(filepath), filename, filepath.replace('\\', '/'), stat.st_size,
+                     stat.st_mtime, guess_doc_type(filename), file_format(filename)))
+
+    with conn:
+        conn.executemany(
+            "INSERT OR IGNORE INTO uploads (digest, filename, path, size, mtime, doc_type, format) "
+            "VALUES (?, ?, ?, ?, ?, ?, ?)", rows)
+        conn.execute(f"PRAGMA user_version = {BACKFILL_VERSION}")
+    return len(rows)
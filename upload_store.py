@@ -0,0 +1,106 @@
+import os
+import hashlib
+import tempfile
+from collections import namedtuple
+
+UPLOAD_FOLDER = os.path.join('static', 'uploads')
+MAX_UPLOAD_BYTES = int(os.environ.get('MAX_UPLOAD_BYTES', 25 * 1024 * 1024))
+CHUNK_SIZE = 1024 * 1024
+# Uploads are served back from static/, so only these types are ever stored;
+# each maps to the one extension its content is stored under
+STORED_EXTENSIONS = {'.pdf': '.pdf', '.png': '.png', '.jpg': '.jpg', '.jpeg': '.jpg'}
+
+StoredUpload = namedtuple('StoredUpload', ['digest', 'filepath', 'filename', 'size', 'is_new'])
+
+class UploadTooLarge(Exception):
+    pass
+
+class UnsupportedUpload(Exception):
+    pass
+
+def stored_path(digest, extension):
+    return os.path.join(UPLOAD_FOLDER, f"{digest}{extension}")
+
+def stored_extension(filename):
+    """The extension an upload named filename is stored under; raises UnsupportedUpload for other types."""
+    extension = os.path.splitext(filename)[1].lower()
+    if extension not in STORED_EXTENSIONS:
+        raise UnsupportedUpload(f"{filename} is not a PDF, PNG or JPEG file")
+    return STORED_EXTENSIONS[extension]
+
+class UploadSpool:
+    """Where the request parser writes one uploaded file.
+
+    The bytes go straight to a temp file in UPLOAD_FOLDER and are hashed on
+    the way, so save_upload only has to rename the file. Past max_bytes the
+    rest of the part is counted but dropped, and save_upload reports it.
+    Closing the spool removes the temp file unless save_upload kept it.
+    """
+
+    def __init__(self, max_bytes=None):
+        self.max_bytes = max_bytes or MAX_UPLOAD_BYTES
+        os.makedirs(UPLOAD_FOLDER, exist_ok=True)
+        fd, self.tmp_path = tempfile.mkstemp(prefix='.upload-', suffix='.part', dir=UPLOAD_FOLDER)
+        self.file = os.fdopen(fd, 'w+b')
+        self.digest = hashlib.sha256()
+        self.size = 0
+
+    def write(self, data):
+        self.size += len(data)
+        if self.size > self.max_bytes:
+            return len(data)
+        self.digest.update(data)
+        return self.file.write(data)
+
+    def __getattr__(self, name):
+        # read, seek and the rest of the file API the parser and FileStorage use
+        return getattr(self.file, name)
+
+    def keep(self, filepath):
+        """Close the spool and move its file to filepath; returns False if filepath already existed."""
+        self.file.close()
+        is_new = not os.path.exists(filepath)
+        if is_new:
+            os.replace(self.tmp_path, filepath)
+        else:
+            os.remove(self.tmp_path)
+        self.tmp_path = None
+        return is_new
+
+    def close(self):
+        self.file.close()
+        if self.tmp_path and os.path.exists(self.tmp_path):
+            os.remove(self.tmp_path)
+        self.tmp_path = None
+
+def save_upload(file):
+    """Store an uploaded file under its sha256 and normalized extension.
+
+    Identical content is stored once: a re-upload returns the existing path
+    with is_new=False. Files parsed into an UploadSpool are just renamed;
+    any other stream is copied through one. Raises UnsupportedUpload for
+    anything but a PDF, PNG or JPEG, and UploadTooLarge past MAX_UPLOAD_BYTES.
+    """
+    extension = stored_extension(file.filename)
+    spool = file.stream
+    if not isinstance(spool, UploadSpool):
+        spool = UploadSpool()
+        try:
+            for chunk in iter(lambda: file.stream.read(CHUNK_SIZE), b""):
+                spool.write(chunk)
+        except BaseException:
+            spool.close()
+            raise
+
+    if spool.size > spool.max_bytes:
+        spool.close()
+        raise UploadTooLarge(f"{file.filename} is larger than {spool.max_bytes // (1024 * 1024)} MB")
+
+    content_hash = spool.digest.hexdigest()
+    filepath = stored_path(content_hash, extension)
+    try:
+        is_new = spool.keep(filepath)
+    except BaseException:
+        spool.close()
+        raise
+    return StoredUpload(content_hash, filepath, file.filename, spool.size, is_new)
@@ -0,0 +1,98 @@
+import os
+import faiss
+
+INDEX_TYPES = ('flat', 'ivf_flat', 'ivf_pq', 'hnsw')
+DEFAULT_INDEX_TYPE = os.environ.get('CHATBOT_INDEX_TYPE', 'flat')
+
+IVF_NLIST = int(os.environ.get('CHATBOT_IVF_NLIST', 256))
+IVF_NPROBE = int(os.environ.get('CHATBOT_IVF_NPROBE', 16))
+PQ_M = int(os.environ.get('CHATBOT_PQ_M', 64))
+PQ_NBITS = int(os.environ.get('CHATBOT_PQ_NBITS', 8))
+HNSW_M = int(os.environ.get('CHATBOT_HNSW_M', 32))
+HNSW_EF_SEARCH = int(os.environ.get('CHATBOT_HNSW_EF_SEARCH', 64))
+# FAISS wants roughly 39 training points per centroid
+TRAINING_POINTS_PER_CENTROID = 39
+# Snapshots of these types can be memory-mapped and still take appends; an
+# mmapped IVF index gets read-only OnDiskInvertedLists, so it is read into memory
+MMAP_INDEX_TYPES = ('flat', 'hnsw')
+
+def build_faiss_index(index_type, dimension):
+    if index_type == 'flat':
+        return faiss.IndexFlatL2(dimension)
+    if index_type == 'hnsw':
+        index = faiss.IndexHNSWFlat(dimension, HNSW_M)
+        index.hnsw.efSearch = HNSW_EF_SEARCH
+        return index
+
+    quantizer = faiss.IndexFlatL2(dimension)
+    if index_type == 'ivf_flat':
+        index = faiss.IndexIVFFlat(quantizer, dimension, IVF_NLIST)
+    elif index_type == 'ivf_pq':
+        if dimension % PQ_M != 0:
+            raise ValueError(f"CHATBOT_PQ_M={PQ_M} must divide the vector dimension {dimension}")
+        index = faiss.IndexIVFPQ(quantizer, dimension, IVF_NLIST, PQ_M, PQ_NBITS)
+    else:
+        raise ValueError(f"Unknown index type '{index_type}'. Choose one of {', '.join(INDEX_TYPES)}")
+    index.nprobe = IVF_NPROBE
+    # Keep vectors reconstructable so the index can be migrated again later
+    index.make_direct_map()
+    return index
+
+def min_training_vectors(index_type):
+    if index_type == 'ivf_flat':
+        return IVF_NLIST * TRAINING_POINTS_PER_CENTROID
+    if index_type == 'ivf_pq':
+        return max(IVF_NLIST, 2 ** PQ_NBITS) * TRAINING_POINTS_PER_CENTROID
+    return 0
+
+class VectorIndex:
+    """FAISS index of a configurable type that trains itself when it can.
+
+    IVF variants need a training set, so vectors are kept in a flat index
+    until min_training_vectors() of them exist; the index is then trained
+    on everything collected so far and rebuilt in place. Vector ids stay
+    the insertion order throughout.
+    """
+
+    def __init__(self, dimension, index_type=None):
+        self.dimension = dimension
+        self.index_type = index_type or DEFAULT_INDEX_TYPE
+        if self.index_type not in INDEX_TYPES:
+            raise ValueError(f"Unknown index type '{self.index_type}'. Choose one of {', '.join(INDEX_TYPES)}")
+        self.index = self._initial_index()
+
+    def _initial_index(self):
+        if min_training_vectors(self.index_type):
+            return faiss.IndexFlatL2(self.dimension)
+        return build_faiss_index(self.index_type, self.dimension)
+
+    @property
+    def ntotal(self):
+        return self.index.ntotal
+
+    @property
+    def is_trained(self):
+        return not min_training_vectors(self.index_type) or not isinstance(self.index, faiss.IndexFlatL2)
+
+    def add(self, vectors):
+        self.index.add(vectors)
+        if not self.is_trained and self.index.ntotal >= min_training_vectors(self.index_type):
+            self.train()
+
+    def train(self):
+        vectors = self.index.reconstruct_n(0, self.index.ntotal)
+        print(f"Training {self.index_type} index on {len(vectors)} vectors...")
+        trained = build_faiss_index(self.index_type, self.dimension)
+        trained.train(vectors)
+        trained.add(vectors)
+        self.index = trained
+
+    def adopt(self, index):
+        """Serve an already-built FAISS index (e.g. a prebuilt snapshot) as this index."""
+        self.index = index
+
+    def search(self, query_vectors, k):
+        return self.index.search(query_vectors, k)
+
+    def reset(self):
+        self.index = self._initial_index()